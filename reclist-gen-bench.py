@@ -0,0 +1,284 @@
+import os
+import sys
+import gc
+import json
+import time
+import random
+import platform
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+import importlib.util
+
+
+def load_generator():
+    # 在进程内载入生成脚本（文件名含连字符，无法直接import）
+    script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reclist-gen-cvvc.py")
+    spec = importlib.util.spec_from_file_location("reclist_gen_cvvc", script_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+generator = load_generator()
+
+phases = ['parse', 'inventory', 'plan', 'write_reclist', 'write_oto']
+# 预设的规模：名称 -> (元音数, 辅音数, 每个元音的CV字数)
+presets = {
+    'small': (8, 20, 25),
+    'medium': (20, 50, 100),
+    'large': (40, 100, 250),
+}
+bundled_presamp = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'presamp.ini')
+startup_phases = ['import', 'language']
+# 在子进程中载入图形界面脚本（不创建窗口）并初始化LanguageManager，输出两步的耗时（秒）
+startup_code = '''
+import sys, time, json, importlib.util
+time_start = time.perf_counter()
+spec = importlib.util.spec_from_file_location("reclist_gen_gui", "reclist-gen-gui.py")
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+time_import = time.perf_counter()
+module.LanguageManager()
+time_language = time.perf_counter()
+print(json.dumps({"import": time_import - time_start, "language": time_language - time_import}))
+'''
+
+
+def make_presamp(filename, vowels=10, consonants=20, syllables=20, seed=0):
+    # 生成合成的presamp文件：每个元音带有syllables个CV字，大部分CV字归属于一个辅音，少数不属于任何辅音
+    # 另外加入与元音同名的辅音以覆盖“#”的处理
+    # 字名中不使用“_”（录音表中“_”是分隔符），用“x”隔开序号
+    rand = random.Random(seed)
+    V_list = ['v' + str(i) for i in range(0, vowels)]
+    C_list = ['c' + str(i) for i in range(0, consonants)] + [V_list[0]]
+    claims = {_c: [] for _c in C_list}
+    lines = ['[VERSION]', '1.7', '[VOWEL]']
+    for _v in V_list:
+        CV_list = [_v]  # 纯元音
+        for i in range(1, syllables):
+            _c = C_list[rand.randrange(0, len(C_list))]
+            name = _c + _v + 'x' + str(i)
+            CV_list.append(name)
+            if rand.random() < 0.98:
+                claims[_c].append(name)
+        lines.append(_v + '=' + _v + '=' + ','.join(CV_list) + '=100')
+    lines.append('[CONSONANT]')
+    for _c in C_list:
+        lines.append(_c + '=' + ','.join(claims[_c]) + '=1')
+    lines.append('[PRIORITY]')
+    lines.append('')
+    with open(filename, 'w', encoding='UTF-8') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def run_phases(presamp, settings, directory, memory=False):
+    # 分别运行各阶段，返回阶段 -> 耗时（秒），memory为True时返回阶段 -> 峰值内存（字节）
+    my_worker = generator.worker()
+    measured = {}
+    gc.collect()
+
+    def start():
+        if memory:
+            tracemalloc.reset_peak()
+        return time.perf_counter()
+
+    def stop(phase, time_start):
+        if memory:
+            measured[phase] = tracemalloc.get_traced_memory()[1]
+        else:
+            measured[phase] = time.perf_counter() - time_start
+
+    time_start = start()
+    parsed = my_worker.parse_presamp(presamp)
+    stop('parse', time_start)
+
+    time_start = start()
+    my_worker.build_inventory(*parsed)
+    stop('inventory', time_start)
+
+    time_start = start()
+    rows = list(my_worker.plan_CVVC(settings['length'], settings['use_planb'], settings['include_CV_head'], settings['include_VV']))
+    stop('plan', time_start)
+
+    time_start = start()
+    texts = [my_worker.render_row(row, settings['use_underbar']) for row in rows]
+    with open(os.path.join(directory, 'Reclist.txt'), 'w', encoding='UTF-8', buffering=generator.write_buffer_size) as f_reclist:
+        for text in texts:
+            f_reclist.write(text + '\n')
+    stop('write_reclist', time_start)
+
+    time_start = start()
+    oto = generator.otowriter(my_worker.symbols, settings['use_planb'], settings['oto_max_of_same_cv'], settings['oto_max_of_same_vc'],
+                              float(settings['oto_preset_blank']), float(settings['oto_bpm']))
+    with open(os.path.join(directory, 'oto.ini'), 'w', encoding='UTF-8', buffering=generator.write_buffer_size) as f_oto:
+        for k in range(0, len(rows)):
+            for kind, entry in oto.entries(texts[k], rows[k]):
+                f_oto.write(entry + '\n')
+    stop('write_oto', time_start)
+
+    counts = {'cv': len(my_worker.cvlist), 'vc': len(my_worker.vclist), 'vv': len(my_worker.vvlist), 'rows': len(rows), 'oto': oto.count}
+    return measured, counts
+
+
+def bench_case(name, presamp, settings, repeat, directory):
+    # 对一个presamp重复运行repeat次，各阶段取最短耗时，另外单独运行一次记录峰值内存
+    times = {}
+    for k in range(0, repeat):
+        measured, counts = run_phases(presamp, settings, directory)
+        for phase in phases:
+            times[phase] = min(times.get(phase, measured[phase]), measured[phase])
+    times['total'] = sum(times[phase] for phase in phases)
+    tracemalloc.start()
+    try:
+        peak, counts = run_phases(presamp, settings, directory, True)
+    finally:
+        tracemalloc.stop()
+    peak['total'] = max(peak[phase] for phase in phases)
+    return {'name': name, 'counts': counts, 'time': times, 'peak_memory': peak}
+
+
+def run_startup():
+    # 在新的解释器中测量一次冷启动，返回阶段 -> 耗时（秒）以及-X importtime报告的各模块累计导入耗时（微秒）
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', startup_code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                               capture_output=True, text=True, encoding='UTF-8', check=True)
+    measured = json.loads(completed.stdout.strip().splitlines()[-1])
+    modules = {}
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2].strip()
+        if '.' not in name:
+            modules[name] = modules.get(name, 0) + int(fields[1])
+    return measured, modules
+
+
+def bench_startup(repeat, top=10):
+    # 重复repeat次冷启动，各阶段取最短耗时；导入耗时最长的顶层模块取最短一次的记录
+    times = {}
+    modules = None
+    for k in range(0, repeat):
+        measured, imported = run_startup()
+        if modules == None or measured['import'] < times['import']:
+            modules = imported
+        for phase in startup_phases:
+            times[phase] = min(times.get(phase, measured[phase]), measured[phase])
+    times['total'] = sum(times[phase] for phase in startup_phases)
+    slowest = sorted(modules.items(), key=lambda item: -item[1])[0:top]
+    return {'name': 'startup', 'time': times, 'imports': [{'module': name, 'cumulative_us': cumulative} for name, cumulative in slowest]}
+
+
+def format_startup(case):
+    # 启动耗时及导入最慢的模块（毫秒）
+    lines = ['startup  ' + '  '.join('{} {:.1f}ms'.format(phase, case['time'][phase] * 1000) for phase in startup_phases + ['total'])]
+    for item in case['imports']:
+        lines.append('  {:<24} {:>8.1f}ms'.format(item['module'], item['cumulative_us'] / 1000))
+    return '\n'.join(lines)
+
+
+def compare(results, baseline, threshold, min_delta):
+    # 与基准结果比较，返回变慢超过阈值的(用例, 阶段, 基准耗时, 本次耗时)
+    old_cases = {case['name']: case for case in baseline['cases']}
+    regressions = []
+    for case in results['cases']:
+        if case['name'] not in old_cases:
+            continue
+        old_time = old_cases[case['name']]['time']
+        for phase in case['time']:
+            if phase not in old_time:
+                continue
+            if case['time'][phase] > old_time[phase] * (1 + threshold) and case['time'][phase] - old_time[phase] > min_delta:
+                regressions.append((case['name'], phase, old_time[phase], case['time'][phase]))
+    return regressions
+
+
+def format_header():
+    # 结果汇总表的表头（耗时单位为毫秒，内存单位为KiB）
+    return '{:<20}  {:>6}  {:>6}  '.format('case', 'cv', 'rows') + '  '.join('{:>13}'.format(phase) for phase in phases + ['total']) + '  {:>9}'.format('peak(KiB)')
+
+
+def format_case(case):
+    # 结果汇总表中一个用例的一行
+    return ('{:<20}  {:>6}  {:>6}  '.format(case['name'], case['counts']['cv'], case['counts']['rows']) +
+            '  '.join('{:>13.1f}'.format(case['time'][phase] * 1000) for phase in phases + ['total']) +
+            '  {:>9}'.format(case['peak_memory']['total'] // 1024))
+
+
+def parse_case(text):
+    # “元音数,辅音数,每个元音的CV字数”
+    vowels, consonants, syllables = [int(x) for x in text.split(',')]
+    return 'v{}c{}s{}'.format(vowels, consonants, syllables), (vowels, consonants, syllables)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='ReclistGen_CVVC benchmark')
+    parser.add_argument('--preset', action='append', choices=sorted(presets), help='合成presamp的预设规模（可多次指定，默认为全部）')
+    parser.add_argument('--case', action='append', default=[], metavar='V,C,S', help='自定义规模：元音数,辅音数,每个元音的CV字数（可多次指定）')
+    parser.add_argument('--no-bundled', action='store_true', help='不测试附带的presamp.ini')
+    parser.add_argument('--config', default='', help='生成设置使用的配置文件（默认为各项默认值）')
+    parser.add_argument('--repeat', type=int, default=3, help='每个用例的重复次数，取最短耗时')
+    parser.add_argument('--seed', type=int, default=0, help='合成presamp的随机种子')
+    parser.add_argument('--output', default='', help='结果的输出路径（JSON）')
+    parser.add_argument('--baseline', default='', help='用于比较的基准结果（JSON）')
+    parser.add_argument('--threshold', type=float, default=0.2, help='某阶段比基准慢超过该比例时判定为性能退化')
+    parser.add_argument('--min-delta', type=float, default=0.005, help='忽略小于该秒数的耗时差异')
+    parser.add_argument('--startup', action='store_true', help='另外测量图形界面的冷启动耗时（载入脚本与LanguageManager初始化）')
+    parser.add_argument('--startup-only', action='store_true', help='只测量图形界面的冷启动耗时')
+    args = parser.parse_args()
+
+    settings = {'length': 8, 'include_CV_head': True, 'include_VV': True, 'use_underbar': True, 'use_planb': False,
+                'oto_max_of_same_cv': 3, 'oto_max_of_same_vc': 3, 'oto_preset_blank': 1250, 'oto_bpm': 130}
+    if args.config != '':
+        config = generator.read_config(args.config)
+        for key in settings:
+            settings[key] = config[key]
+
+    cases = []
+    if args.startup_only:
+        pass
+    elif not args.no_bundled:
+        cases.append(('bundled', None))
+    for preset in ([] if args.startup_only else args.preset or ([] if args.case else sorted(presets, key=lambda _name: presets[_name]))):
+        cases.append((preset, presets[preset]))
+    for text in args.case:
+        cases.append(parse_case(text))
+
+    results = {'version': generator.version, 'python': platform.python_version(), 'platform': platform.platform(),
+               'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'settings': settings, 'seed': args.seed, 'repeat': args.repeat, 'cases': []}
+    if len(cases) > 0:
+        print(format_header())
+    with tempfile.TemporaryDirectory() as directory:
+        for name, size in cases:
+            if size == None:
+                presamp = bundled_presamp
+            else:
+                presamp = os.path.join(directory, name + '.ini')
+                make_presamp(presamp, size[0], size[1], size[2], args.seed)
+            case = bench_case(name, presamp, settings, args.repeat, directory)
+            if size != None:
+                case['size'] = {'vowels': size[0], 'consonants': size[1], 'syllables': size[2]}
+            results['cases'].append(case)
+            print(format_case(case), flush=True)
+    if args.startup or args.startup_only:
+        case = bench_startup(args.repeat)
+        results['cases'].append(case)
+        print(format_startup(case), flush=True)
+
+    if args.output != '':
+        with open(args.output, 'w', encoding='UTF-8') as f:
+            json.dump(results, f, indent=4)
+
+    if args.baseline != '':
+        with open(args.baseline, 'r', encoding='UTF-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.min_delta)
+        for name, phase, old_time, new_time in regressions:
+            print('REGRESSION {} {}: {:.1f}ms -> {:.1f}ms (+{:.0%})'.format(name, phase, old_time * 1000, new_time * 1000, new_time / old_time - 1))
+        if len(regressions) > 0:
+            sys.exit(1)
@@ -1,11 +1,153 @@
 import re
 import codecs
+import bisect
+import collections
+import configparser
+import os
+import sys
+import time
+import shutil
+import tempfile
+import contextlib
+import hashlib
+import mmap
+import pickle
+import json
+import itertools
+import random
+import tracemalloc
+# argparse只在命令行中使用，concurrent.futures、cProfile、pstats、sqlite3只在批量生成、--profile和导出数据库时使用，在用到时才导入，以缩短图形界面的启动时间
 
 version = "200621"
 debug = False
+write_buffer_size = 1 << 16  # 写入录音表和oto时的缓冲区大小
+parser_version = 3  # read_presamp的结果格式变化时需要增加，使旧的缓存失效
+# 缓存目录，可以用环境变量RECLIST_GEN_CVVC_CACHE指定（批量生成的工作进程也会继承）
+cache_dir = os.environ.get('RECLIST_GEN_CVVC_CACHE', os.path.join(os.path.expanduser('~'), '.reclist-gen-cvvc', 'cache'))
+presamp_cache_max_bytes = 64 * 1024 * 1024  # presamp缓存的最大总大小
+result_cache_max_bytes = 256 * 1024 * 1024  # 生成结果缓存的最大总大小
+result_cache_max_entries = 32  # 生成结果缓存的最大条目数
+profile_top = 30  # 统计中记录的cProfile函数数
+planners = ('greedy', 'graph')  # 补全VC部的算法
+_measure_peaks = []  # 正在记录内存峰值的各层阶段中，内部阶段已经结束的部分的峰值（绝对值）
+
+
+@contextlib.contextmanager
+def measure(timing, memory, phase):
+    # 记录一个阶段的耗时（累加），tracemalloc开启时同时记录该阶段新增的内存峰值
+    # 阶段可以嵌套：内部阶段开始时会重置峰值，结束时将其峰值交给外层阶段
+    tracing = memory != None and tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+        memory_start = tracemalloc.get_traced_memory()[0]
+        _measure_peaks.append(0)
+    time_start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing[phase] = timing.get(phase, 0.0) + time.perf_counter() - time_start
+        if tracing:
+            peak = max(tracemalloc.get_traced_memory()[1], _measure_peaks.pop())
+            memory[phase] = max(memory.get(phase, 0), peak - memory_start)
+            if len(_measure_peaks) > 0:
+                _measure_peaks[len(_measure_peaks) - 1] = max(_measure_peaks[len(_measure_peaks) - 1], peak)
+
+
+def presamp_digest(filename):
+    # presamp文件内容的SHA-256，用作缓存的键
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def presamp_sections(data):
+    # 在presamp的字节内容（bytes或mmap）中查找各节的标题行，逐个返回(节名, 内容的开始偏移, 内容的结束偏移)
+    # 与旧的读取方式一致：含有“[VOWEL]”或“[CONSONANT]”的行开始对应的节，其他含有“[”的行开始一个忽略的节（节名为''）
+    # 只搜索“[”和换行，不解码各节的内容
+    size = len(data)
+    name = ''
+    start = 0
+    pos = data.find(b'[')
+    while pos != -1:
+        line_start = data.rfind(b'\n', 0, pos) + 1
+        line_end = data.find(b'\n', pos)
+        if line_end == -1:
+            line_end = size
+        yield name, start, line_start
+        header = data[line_start:line_end]
+        if header.find(b'[VOWEL]') != -1:
+            name = 'VOWEL'
+        elif header.find(b'[CONSONANT]') != -1:
+            name = 'CONSONANT'
+        else:
+            name = ''
+        start = min(line_end + 1, size)
+        pos = data.find(b'[', start)
+    yield name, start, size
+
+
+def presamp_line_number(data, offset):
+    # 偏移offset所在的行号（从1开始），只在报告错误时使用
+    line = 1
+    pos = data.find(b'\n', 0, offset)
+    while pos != -1:
+        line += 1
+        pos = data.find(b'\n', pos + 1, offset)
+    return line
+
+
+def cache_evict(directory, max_bytes, max_entries=None):
+    # 按最近使用时间（mtime）删除最旧的缓存条目，使缓存目录不超过限定的大小和条目数
+    # 每个条目是一个文件，或者是一个目录（大小为其中文件的合计）
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith('.part'):
+            continue
+        if entry.is_file():
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        elif entry.is_dir():
+            size = sum(_file.stat().st_size for _file in os.scandir(entry.path) if _file.is_file())
+            entries.append((entry.stat().st_mtime, size, entry.path))
+    entries.sort()
+    total = sum(entry[1] for entry in entries)
+    count = len(entries)
+    for mtime, size, entry_path in entries:
+        if total <= max_bytes and (max_entries == None or count <= max_entries):
+            break
+        try:
+            if os.path.isdir(entry_path):
+                shutil.rmtree(entry_path)
+            else:
+                os.remove(entry_path)
+        except OSError:
+            continue
+        total -= size
+        count -= 1
+
+
+class symtab:
+    # 音素名与整数编号的对照表，cv中的C和V均以编号保存，仅在输出时还原为音素名
+    def __init__(self):
+        self.ids = {}  # 音素名 -> 编号
+        self.names = []  # 编号 -> 音素名
+        self.aliases = []  # 编号 -> oto中使用的音素名（去掉区分辅音与元音的'#'）
+
+    def intern(self, name):
+        sid = self.ids.get(name)
+        if sid == None:
+            sid = len(self.names)
+            self.ids[name] = sid
+            self.names.append(name)
+            self.aliases.append(name.replace('#', ''))
+        return sid
 
 
 class cv:
+    __slots__ = ('name', 'c', 'v', 'type')
+
     def __init__(self, name, c, v, type):
         self.name = name
         self.c = c
@@ -13,14 +155,544 @@ class cv:
         self.type = type
 
 
+class unitpool:
+    # 按原顺序保存余下的单元，查询、删除、取出第一个单元均为O(1)（均摊）
+    # 指定key时，还可以取出第一个key(单元)符合要求的单元
+    def __init__(self, items, key=None):
+        self.items = list(items)
+        self.alive = [True] * len(self.items)
+        self.count = len(self.items)
+        self.head = 0
+        self.pos = {}  # 单元 -> 该单元尚未删除的位置（升序）
+        for i in range(0, len(self.items)):
+            self.pos.setdefault(self.items[i], collections.deque()).append(i)
+        self.key_pos = None  # key -> 符合该key的单元的位置（升序）
+        self.key_head = None  # key -> 上次在key_pos中找到的位置
+        if key != None:
+            self.key_pos = {}
+            self.key_head = {}
+            for i in range(0, len(self.items)):
+                self.key_pos.setdefault(key(self.items[i]), []).append(i)
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, item):
+        positions = self.pos.get(item)
+        return bool(positions)
+
+    def __iter__(self):
+        for i in range(self.head, len(self.items)):
+            if self.alive[i]:
+                yield self.items[i]
+
+    def remove(self, item):
+        # 与list.remove相同，删除第一个出现的该单元
+        positions = self.pos.get(item)
+        if not positions:
+            raise ValueError('unitpool.remove(x): x not in pool')
+        self.alive[positions.popleft()] = False
+        self.count -= 1
+
+    def first(self):
+        while self.head < len(self.items) and not self.alive[self.head]:
+            self.head += 1
+        if self.head < len(self.items):
+            return self.items[self.head]
+        return None
+
+    def first_with(self, key):
+        positions = self.key_pos.get(key)
+        if positions == None:
+            return None
+        i = self.key_head.get(key, 0)
+        while i < len(positions) and not self.alive[positions[i]]:
+            i += 1
+        self.key_head[key] = i
+        if i < len(positions):
+            return self.items[positions[i]]
+        return None
+
+
+class trie:
+    # 音素名的前缀树，用于切分不使用下划线的录音表
+    def __init__(self, names):
+        self.root = {}
+        for name in names:
+            node = self.root
+            for char in name:
+                node = node.setdefault(char, {})
+            node[''] = name
+
+    def ends(self, text, start):
+        # 返回从start开始能匹配的所有音素的结束位置（升序）
+        node = self.root
+        ends = []
+        for k in range(start, len(text)):
+            node = node.get(text[k])
+            if node == None:
+                break
+            if '' in node:
+                ends.append(k + 1)
+        return ends
+
+    def readings(self, text, limit=8):
+        # 返回完整切分一段不含空拍的文本的方式（音素名的列表，最多limit种），不能完整切分时返回[]
+        # 第一种为最长匹配：每个位置取能使其余部分完整切分的最长的音素
+        # 每个位置只查询一次前缀树，并先求出从各位置起能否完整切分，只沿能完整切分的分支展开
+        matches = [self.ends(text, k) for k in range(0, len(text))]
+        complete = [False] * len(text) + [True]  # complete[k]：text[k:]能否完整切分
+        for k in range(len(text) - 1, -1, -1):
+            for end in matches[k]:
+                if complete[end]:
+                    complete[k] = True
+                    break
+        found = []
+        if not complete[0]:
+            return found
+        stack = [(0, [])]
+        while stack and len(found) < limit:
+            start, names = stack.pop()
+            if start == len(text):
+                found.append(names)
+                continue
+            for end in matches[start]:  # 后入栈的最长匹配先展开
+                if complete[end]:
+                    stack.append((end, names + [text[start:end]]))
+        return found
+
+    def split(self, text):
+        # 按最长匹配切分不能完整切分的文本，无法匹配的部分作为一个整体返回
+        names = []
+        start = 0
+        unknown = 0  # 尚未结束的无法匹配部分的起点
+        while start < len(text):
+            ends = self.ends(text, start)
+            if len(ends) == 0:
+                start += 1
+                continue
+            if unknown < start:
+                names.append(text[unknown:start])
+            names.append(text[start:ends[len(ends) - 1]])
+            start = unknown = ends[len(ends) - 1]
+        if unknown < len(text):
+            names.append(text[unknown:])
+        return names
+
+
+class result:
+    # generate()的返回结果
+    def __init__(self):
+        self.rows = 0  # 录音表行数
+        self.fillers = 0  # 增字数
+        self.vc_remaining = 0  # 余下的VC部数（生成过程中更新）
+        self.oto_count = 0  # oto条目数
+        self.repeat = {}  # 重复别名 -> 条目数
+        self.timing = {}  # 各阶段耗时（秒）
+        self.added_rows = 0  # 增量生成时追加的行数
+        self.diff = {}  # 增量生成时新旧presamp的差异（种类 -> (新增, 删除)）
+        self.memory = {}  # 各阶段新增的内存峰值（字节），仅在tracemalloc开启时记录
+        self.counters = {}  # 排列与oto生成过程中的计数
+        self.profile = []  # cProfile中累计耗时最长的函数
+        self.seed = 0  # 打乱音素顺序的随机种子（0为原始顺序）
+        self.coverage = {}  # 录音表覆盖检查的结果（见coverage.report()）
+
+    def stats(self):
+        # 以可转换为JSON的形式返回统计
+        return {
+            'version': version,
+            'rows': self.rows,
+            'fillers': self.fillers,
+            'oto_count': self.oto_count,
+            'added_rows': self.added_rows,
+            'seed': self.seed,
+            'coverage': self.coverage,
+            'repeat_aliases': len(self.repeat),
+            'timing': self.timing,
+            'memory': self.memory,
+            'counters': self.counters,
+            'diff': {kind: {'added': self.diff[kind][0], 'removed': self.diff[kind][1]} for kind in self.diff},
+            'profile': self.profile,
+        }
+
+    def write_stats(self, filename):
+        # 将统计写入JSON文件
+        with open(filename, 'w', encoding='UTF-8') as f:
+            json.dump(self.stats(), f, ensure_ascii=False, indent=4)
+
+
+# oto各列的默认值（单位为拍）：(偏移, 固定范围, 右空白, 先行发声)，重叠为先行发声的1/3
+# 种类为'cv'、'vc'以及句尾的'vr'（V_R）
+default_oto_timing = {
+    'cv': (-0.1, 0.3, -0.7, 0.1),
+    'vc': (-0.5, 0.65, -1, 0.5),
+    'vr': (-0.5, 0.65, -1, 0.5),
+}
+
+
+class otowriter:
+    # 逐行生成oto条目，相同别名的编号由计数器决定
+    # timing为辅音分类 -> {'consonants': 辅音列表, 种类: (偏移, 固定范围, 右空白, 先行发声)}，分类'default'作用于所有辅音
+    def __init__(self, symbols, UsePlanB=True, OtoMaxOfSameCV=3, OtoMaxOfSameVC=3, preset_blank=float(1250), oto_bpm=float(130), timing=None):
+        self.symbols = symbols
+        self.UsePlanB = UsePlanB
+        self.OtoMaxOfSameCV = OtoMaxOfSameCV
+        self.OtoMaxOfSameVC = OtoMaxOfSameVC
+        self.preset_blank = preset_blank
+        self.ticks = float(60) / oto_bpm * float(1000)
+        self.exist_count_cv = {}  # 各CV别名已写入的条目数
+        self.exist_count_vc = {}  # 各VC别名已写入的条目数
+        self.count = 0  # 已生成的条目数
+        self.dropped_cv = 0  # 因超出OtoMaxOfSameCV而省略的条目数
+        self.dropped_vc = 0  # 因超出OtoMaxOfSameVC而省略的条目数（含V_R）
+        self.beat = 0  # entries()最近一次返回的条目所在的拍（从0开始，V_R为句尾之后的一拍）
+        self.timing = timing or {}
+        for _class in self.timing:
+            for kind in self.timing[_class]:
+                if kind != 'consonants' and (kind not in default_oto_timing or len(self.timing[_class][kind]) != 4):
+                    raise ValueError('invalid oto timing: ' + _class + '.' + kind)
+        # C编号 -> 辅音分类
+        self.consonant_class = {}
+        for _class in self.timing:
+            for _name in self.timing[_class].get('consonants', []):
+                for sid in (symbols.ids.get(_name), symbols.ids.get(_name + '#')):
+                    if sid != None:
+                        self.consonant_class[sid] = _class
+        self.fields_table = {}  # (种类, 辅音分类, 拍位置) -> 别名之后的各列文本
+
+    def fields(self, kind, _class, count):
+        # 返回别名之后的各列文本，只与种类、辅音分类和所在拍的位置有关，计算一次后查表
+        key = (kind, _class, count)
+        text = self.fields_table.get(key)
+        if text == None:
+            profile = default_oto_timing[kind]
+            for _name in (_class, 'default'):
+                if _name != None and kind in self.timing.get(_name, {}):
+                    profile = self.timing[_name][kind]
+                    break
+            offset, consonant, cutoff, preutterance = profile
+            ticks = self.ticks
+            text = ',' + "{:.1f}".format(self.preset_blank + offset * ticks + float(count) * ticks)
+            text += ',' + "{:.1f}".format(consonant * ticks)
+            text += ',' + "{:.1f}".format(cutoff * ticks)
+            text += ',' + "{:.1f}".format(preutterance * ticks)
+            text += ',' + "{:.1f}".format(preutterance * ticks / float(3))
+            self.fields_table[key] = text
+        return text
+
+    def entries(self, reclist_text, row):
+        # 生成一行的oto条目，依次返回(种类, 条目文本)，种类为'cv'或'vc'（V_R也属于'vc'）
+        names = self.symbols.names
+        aliases = self.symbols.aliases
+        consonant_class = self.consonant_class
+        row_text = reclist_text + ".wav="
+        count = 0
+        row_count = 0
+        cv_last = None
+        for _cv in row:
+            if _cv.name == 'blank':
+                count = count + 1
+                cv_last = None
+                continue
+            # VC
+            if cv_last != None:
+                _name = names[cv_last.v] + ' ' + aliases[_cv.c]
+                exist_count = self.exist_count_vc.get(_name, 0)
+                if self.OtoMaxOfSameVC == -1 or exist_count < self.OtoMaxOfSameVC:
+                    text = row_text + _name
+                    if exist_count > 0:
+                        text += str(exist_count + 1)
+                    text += self.fields('vc', consonant_class.get(_cv.c), count)
+                    self.exist_count_vc[_name] = exist_count + 1
+                    self.count += 1
+                    self.beat = count
+                    yield 'vc', text
+                else:
+                    self.dropped_vc += 1
+
+            # CV
+            if cv_last:
+                _name = _cv.name
+            else:
+                _name = "- " + _cv.name
+
+            if self.UsePlanB and row_count == 2 and len(row) == 3:
+                _name = _name + "_L"
+
+            exist_count = self.exist_count_cv.get(_name, 0)
+            if self.OtoMaxOfSameCV == -1 or exist_count < self.OtoMaxOfSameCV:
+                text = row_text + _name
+                if exist_count > 0:
+                    text += str(exist_count + 1)
+                text += self.fields('cv', consonant_class.get(_cv.c), count)
+                self.exist_count_cv[_name] = exist_count + 1
+                self.count += 1
+                self.beat = count
+                yield 'cv', text
+            else:
+                self.dropped_cv += 1
+
+            cv_last = _cv
+            count += 1
+            row_count += 1
+
+        # V_R
+        _name = names[cv_last.v] + ' R'
+        exist_count = self.exist_count_vc.get(_name, 0)
+        if self.OtoMaxOfSameVC == -1 or exist_count < self.OtoMaxOfSameVC:
+            text = row_text + _name
+            if exist_count > 0:
+                text += str(exist_count + 1)
+            text += self.fields('vr', None, count)
+            self.exist_count_vc[_name] = exist_count + 1
+            self.count += 1
+            self.beat = count
+            yield 'vc', text
+        else:
+            self.dropped_vc += 1
+
+    def reserve(self, line, known):
+        # 保留的已有条目占用其别名：使之后相同的别名接着编号，并计入最多条目数
+        # 别名末尾的数字可能是编号（从2开始）也可能是字名的一部分，取known（可以生成的别名的集合）中去掉数字最少的一种
+        alias = oto_alias(line)
+        candidates = [(alias, 1)]
+        for k in range(len(alias) - 1, 0, -1):
+            if not alias[k].isdigit():
+                break
+            if alias[k] != '0' and int(alias[k:]) >= 2:
+                candidates.append((alias[:k], int(alias[k:])))
+        for _name, number in candidates:
+            if _name in known:
+                if oto_kind(line) == 'cv':
+                    exist_count_dict = self.exist_count_cv
+                else:
+                    exist_count_dict = self.exist_count_vc
+                exist_count_dict[_name] = max(exist_count_dict.get(_name, 0), number)
+                return
+
+    def with_beats(self, entries):
+        # 在entries()返回的(种类, 条目文本)之后加上所在的拍
+        for kind, text in entries:
+            yield kind, text, self.beat
+
+    def repeat(self):
+        # 根据最终的条目数一次性生成重复别名的记录（别名 -> 条目数）
+        repeat = {}
+        for exist_count_dict in (self.exist_count_cv, self.exist_count_vc):
+            for _name in exist_count_dict:
+                if exist_count_dict[_name] > 1:
+                    repeat[_name] = exist_count_dict[_name]
+        return repeat
+
+
+def oto_alias(line):
+    # 取出oto条目的别名
+    return line[line.find('=') + 1:].split(',')[0]
+
+
+def oto_kind(line):
+    # 根据别名判断oto条目的种类（'cv'或'vc'）
+    alias = oto_alias(line)
+    if alias.startswith('- ') or alias.find(' ') == -1:
+        return 'cv'
+    return 'vc'
+
+
+def read_oto(filename):
+    # 读取oto文件，按录音文件分组（录音文件名 -> 条目列表，保持原有顺序）
+    oto_lines = {}
+    with open(filename, 'r', encoding='UTF-8') as f:
+        for line in f:
+            line = line.rstrip('\r\n')
+            if line.find('=') == -1:
+                continue
+            wav = line[:line.find('=')]
+            if wav.endswith('.wav'):
+                wav = wav[:-len('.wav')]
+            oto_lines.setdefault(wav, []).append(line)
+    return oto_lines
+
+
+class plandb:
+    # 将录音表的排列（各行、各拍的音素）和oto条目写入SQLite数据库，便于按别名、行或音素种类查询
+    # 先写入临时文件，每满batch_size条一次性插入，全部写完后再建立索引并替换目标文件
+    batch_size = 10000
+    schema = (
+        'CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)',
+        # 录音表的各行（row从1开始，与录音表中的行号相同）
+        'CREATE TABLE rows (row INTEGER PRIMARY KEY, text TEXT NOT NULL, wav TEXT NOT NULL)',
+        # 各拍的音素：cv、blank（R）、unknown（presamp中不存在的字），以及进入该拍时的vc、vv；vr为句尾之后的一拍
+        'CREATE TABLE units (row INTEGER NOT NULL, beat INTEGER NOT NULL, type TEXT NOT NULL, name TEXT NOT NULL)',
+        # oto条目（不属于录音表的条目row和beat为NULL，无法解析的数值为NULL）
+        'CREATE TABLE oto (id INTEGER PRIMARY KEY, row INTEGER, beat INTEGER, kind TEXT NOT NULL, wav TEXT NOT NULL, alias TEXT NOT NULL, '
+        'offset REAL, consonant REAL, cutoff REAL, preutterance REAL, overlap REAL)',
+    )
+    indexes = (
+        'CREATE INDEX oto_alias ON oto (alias)',
+        'CREATE INDEX oto_row ON oto (row, beat)',
+        'CREATE INDEX units_row ON units (row, beat)',
+        'CREATE INDEX units_type ON units (type, name)',
+    )
+
+    def __init__(self, path, my_worker):
+        import sqlite3
+        self.path = path
+        self.worker = my_worker
+        if os.path.exists(path + '.part'):
+            os.remove(path + '.part')
+        self.connection = sqlite3.connect(path + '.part')
+        self.connection.execute('PRAGMA journal_mode = OFF')
+        self.connection.execute('PRAGMA synchronous = OFF')
+        for statement in self.schema:
+            self.connection.execute(statement)
+        self.connection.execute('BEGIN')
+        self.rows = []
+        self.units = []
+        self.oto = []
+        self.row_count = 0
+
+    def add_row(self, text, row):
+        # 加入录音表的一行，返回其行号
+        self.row_count += 1
+        self.rows.append((self.row_count, text, text + '.wav'))
+        names = self.worker.symbols.names
+        cv_last = None
+        for beat in range(0, len(row)):
+            _cv = row[beat]
+            if _cv.type == 'unknown':
+                self.units.append((self.row_count, beat, 'unknown', _cv.name))
+                cv_last = None
+                continue
+            if _cv.type == 'blank':
+                self.units.append((self.row_count, beat, 'blank', 'R'))
+                cv_last = None
+                continue
+            if cv_last != None:
+                _unit = self.worker.vc_map.get((_cv.c, cv_last.v))
+                if _unit == None:
+                    _unit = self.worker.vv_map.get((_cv.c, cv_last.v))
+                if _unit != None:
+                    self.units.append((self.row_count, beat, _unit.type, _unit.name))
+            self.units.append((self.row_count, beat, 'cv', _cv.name))
+            cv_last = _cv
+        if cv_last != None:
+            self.units.append((self.row_count, len(row), 'vr', names[cv_last.v] + ' R'))
+        if len(self.units) >= self.batch_size:
+            self.flush()
+        return self.row_count
+
+    def add_entry(self, row, beat, kind, entry):
+        # 加入一条oto条目（wav=别名,偏移,固定范围,右空白,先行发声,重叠）
+        wav, fields = entry.split('=', 1)
+        values = fields.rsplit(',', 5)
+        if len(values) == 6:
+            try:
+                numbers = [float(x) for x in values[1:]]
+            except ValueError:
+                numbers = [None] * 5
+        else:
+            values = [fields]
+            numbers = [None] * 5
+        self.oto.append((row, beat, kind, wav, values[0], *numbers))
+        if len(self.oto) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        self.connection.executemany('INSERT INTO rows VALUES (?, ?, ?)', self.rows)
+        self.connection.executemany('INSERT INTO units VALUES (?, ?, ?, ?)', self.units)
+        self.connection.executemany('INSERT INTO oto (row, beat, kind, wav, alias, offset, consonant, cutoff, preutterance, overlap) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', self.oto)
+        self.rows = []
+        self.units = []
+        self.oto = []
+
+    def close(self, meta):
+        # 写入剩余的数据和meta（键 -> 值），建立索引后替换目标文件
+        self.flush()
+        self.connection.executemany('INSERT INTO meta VALUES (?, ?)', [(key, str(meta[key])) for key in meta])
+        for statement in self.indexes:
+            self.connection.execute(statement)
+        self.connection.commit()
+        self.connection.close()
+        os.replace(self.path + '.part', self.path)
+
+    def abort(self):
+        # 取消或出错时删除临时文件
+        self.connection.close()
+        if os.path.exists(self.path + '.part'):
+            os.remove(self.path + '.part')
+
+
+class cancelled(Exception):
+    # 生成被取消时抛出
+    pass
+
+
 class worker():
-    cvlist = []
-    vclist = []
-    vvlist = []
-    clist = []
-    vlist = []
+    def __init__(self):
+        self.symbols = symtab()  # C、V均以symbols中的编号表示
+        self.cvlist = []
+        self.vclist = []
+        self.vvlist = []
+        self.clist = []
+        self.vlist = []
+        self.multi_claimed = {}  # 属于多个辅音的字 -> 这些辅音的名称（取最后一个）
+        self.unclaimed = []  # 不属于任何辅音、又不是纯元音（与元音同名）的字，视为纯元音
+        self.timing = {}  # read_presamp各阶段的耗时
+        self.memory = {}  # read_presamp各阶段新增的内存峰值
+        self.counters = {}  # 搜索CV的次数等计数，每次排列前清零
+
+    # 以下索引在read_presamp之后建立，用于代替对cvlist等的线性搜索
+    cv_pos = None  # cv -> cvlist中的位置
+    c_pos = None  # C编号 -> 以该C开头的CV在cvlist中的位置（升序）
+    v_pos = None  # V编号 -> 以该V结尾的CV在cvlist中的位置（升序）
+    vc_map = None  # (C, V) -> vclist中第一个符合的VC部
+    vv_map = None  # (C, V) -> vvlist中第一个符合的VV部
+    syllables = None  # cvlist中音素名的前缀树，切分不使用下划线的录音表时才建立
+    ambiguous_splits = None  # read_reclist()读到的有多种切分方式的部分：(行号, 原文, 各种切分方式)
+
+    def build_index(self):
+        # 建立cvlist的索引
+        self.cv_pos = {}
+        self.c_pos = [[] for sid in range(0, len(self.symbols.names))]
+        self.v_pos = [[] for sid in range(0, len(self.symbols.names))]
+        for i in range(0, len(self.cvlist)):
+            _cv = self.cvlist[i]
+            self.cv_pos[_cv] = i
+            self.c_pos[_cv.c].append(i)
+            self.v_pos[_cv.v].append(i)
+
+    def build_unit_index(self):
+        # 建立VC部、VV部的(c, v)索引
+        self.vc_map = {}
+        for _vc in self.vclist:
+            self.vc_map.setdefault((_vc.c, _vc.v), _vc)
+        self.vv_map = {}
+        for _vv in self.vvlist:
+            self.vv_map.setdefault((_vv.c, _vv.v), _vv)
+
+    def find_indexed(self, positions, fromindex, cyclic):
+        # 在升序的位置列表中找到fromindex之后的第一个位置，必要时从头循环
+        # findcv_scanned记录线性搜索时需要检查的CV数
+        counters = self.counters
+        counters['findcv_calls'] = counters.get('findcv_calls', 0) + 1
+        if positions:
+            i = bisect.bisect_left(positions, fromindex)
+            if i < len(positions):
+                counters['findcv_scanned'] = counters.get('findcv_scanned', 0) + positions[i] - fromindex + 1
+                return self.cvlist[positions[i]]
+            if cyclic:
+                counters['findcv_scanned'] = counters.get('findcv_scanned', 0) + len(self.cvlist) - fromindex + positions[0] + 1
+                return self.cvlist[positions[0]]
+        counters['findcv_misses'] = counters.get('findcv_misses', 0) + 1
+        counters['findcv_scanned'] = counters.get('findcv_scanned', 0) + max(0, len(self.cvlist) - fromindex) + (len(self.cvlist) if cyclic else 0)
+        return None
 
     def findcv(self, list, c, v, fromindex=0):
+        self.counters['findcv_calls'] = self.counters.get('findcv_calls', 0) + 1
+        if fromindex == 0 and list is self.vclist and self.vc_map is not None:
+            return self.vc_map.get((c, v))
+        if fromindex == 0 and list is self.vvlist and self.vv_map is not None:
+            return self.vv_map.get((c, v))
         for i in range(fromindex, len(list)):
             cv = list[i]
             if(cv.c == c and cv.v == v):
@@ -28,6 +700,8 @@ class worker():
         return None
 
     def findcv_c(self, list, c, fromindex=0, cyclic=False):
+        if list is self.cvlist and self.c_pos is not None:
+            return self.find_indexed(self.c_pos[c], fromindex, cyclic)
         for i in range(fromindex, len(list)):
             cv = list[i]
             if(cv.c == c):
@@ -42,6 +716,8 @@ class worker():
         return None
 
     def findcv_v(self, list, v, fromindex=0, cyclic=False):
+        if list is self.cvlist and self.v_pos is not None:
+            return self.find_indexed(self.v_pos[v], fromindex, cyclic)
         for i in range(fromindex, len(list)):
             cv = list[i]
             if(cv.v == v):
@@ -54,69 +730,165 @@ class worker():
                     return cv
         return None
 
+    def load_presamp(self, filename='presamp.ini', use_cache=True):
+        # 读取presamp，内容相同且已经读取过时直接使用缓存，返回是否使用了缓存
+        if not use_cache:
+            self.read_presamp(filename)
+            return False
+        key = presamp_digest(filename) + '-' + str(parser_version)
+        directory = os.path.join(cache_dir, 'presamp')
+        cache_path = os.path.join(directory, key + '.pickle')
+        try:
+            with open(cache_path, 'rb') as f:
+                self.restore_inventory(pickle.load(f))
+            os.utime(cache_path)  # 记录最近使用时间
+            return True
+        except FileNotFoundError:
+            pass
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, KeyError, IndexError, TypeError):
+            self.__init__()  # 缓存损坏时重新读取
+        self.read_presamp(filename)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(cache_path + '.part', 'wb') as f:
+                pickle.dump(self.inventory_data(), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(cache_path + '.part', cache_path)
+            cache_evict(directory, presamp_cache_max_bytes)
+        except OSError:
+            pass  # 无法写入缓存时不影响生成
+        return False
+
+    def inventory_data(self):
+        # 将读取结果转换为只含基本类型的数据，以便缓存
+        return {
+            'names': self.symbols.names,
+            'clist': self.clist,
+            'vlist': self.vlist,
+            'cvlist': [(_cv.name, _cv.c, _cv.v) for _cv in self.cvlist],
+            'vclist': [(_vc.name, _vc.c, _vc.v) for _vc in self.vclist],
+            'vvlist': [(_vv.name, _vv.c, _vv.v) for _vv in self.vvlist],
+            'multi_claimed': self.multi_claimed,
+            'unclaimed': self.unclaimed,
+        }
+
+    def restore_inventory(self, data):
+        # 从inventory_data()的结果恢复读取结果
+        self.__init__()
+        for name in data['names']:
+            self.symbols.intern(name)
+        self.clist = list(data['clist'])
+        self.vlist = list(data['vlist'])
+        self.cvlist = [cv(name, c, v, 'cv') for name, c, v in data['cvlist']]
+        self.vclist = [cv(name, c, v, 'vc') for name, c, v in data['vclist']]
+        self.vvlist = [cv(name, c, v, 'vv') for name, c, v in data['vvlist']]
+        self.multi_claimed = dict(data['multi_claimed'])
+        self.unclaimed = list(data['unclaimed'])
+        self.build_index()
+        self.build_unit_index()
+
     def read_presamp(self, filename='presamp.ini'):
+        with measure(self.timing, self.memory, 'parse'):
+            parsed = self.parse_presamp(filename)
+        with measure(self.timing, self.memory, 'inventory'):
+            self.build_inventory(*parsed)
+
+    def parse_presamp(self, filename='presamp.ini'):
+        # 读取presamp中的[VOWEL]与[CONSONANT]部分，返回(V_list, C_list, CV_V_list, CV_C_list)
+        # 以内存映射方式读取，先按标题行划分各节，只解码需要的两节，其余各节（[PRIORITY]、[REPLACE]、[ALIAS]等）直接跳过
+        # 空行忽略，格式错误的行报告文件名和行号（ValueError）
         V_list = []
         C_list = []
         CV_V_list = []
         CV_C_list = []
-        tag = ''
-        for temp in open(filename, 'r', encoding='UTF-8').readlines():
-            if (temp.find('[VOWEL]') != -1):
-                tag = '[VOWEL]'
-            elif (temp.find('[CONSONANT]') != -1):
-                tag = '[CONSONANT]'
-            elif (temp.find('[') != -1):
-                tag = ''
-            else:
-                if(tag == '[VOWEL]'):
-                    temp_list = re.split(r'[,=]+', temp)
-                    V_list.append(temp_list[0])
-                    CV_V_list.append(temp_list[2:-1])
-                elif(tag == '[CONSONANT]'):
-                    temp_list = re.split(r'[,=]+', temp)
-                    if V_list.count(temp_list[0]) == 0:
-                        C_list.append(temp_list[0])
-                    else:
-                        C_list.append(temp_list[0] + '#')
-                    CV_C_list.append(temp_list[1:-1])
-        l = -1
+        with open(filename, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return V_list, C_list, CV_V_list, CV_C_list
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                for name, start, end in presamp_sections(data):
+                    if name == '' or start >= end:
+                        continue
+                    try:
+                        body = data[start:end].decode('UTF-8')
+                    except UnicodeDecodeError as e:
+                        raise ValueError('{}:{}: not UTF-8'.format(filename, presamp_line_number(data, start + e.start))) from None
+                    lines = body.split('\n')
+                    for k in range(0, len(lines)):
+                        temp = lines[k].rstrip('\r')
+                        if temp.strip() == '':
+                            continue
+                        # 与按行读取时一致，除最后一行外行尾带有换行（使最后一项被舍去）
+                        if k < len(lines) - 1:
+                            temp += '\n'
+                        temp_list = re.split(r'[,=]+', temp)
+                        if name == 'VOWEL':
+                            if temp.count('=') < 2 or temp_list[0] == '':
+                                raise ValueError('{}:{}: malformed [VOWEL] entry (vowel=alias=CV,...=volume): {}'.format(
+                                    filename, presamp_line_number(data, start) + k, temp.strip()))
+                            V_list.append(temp_list[0])
+                            CV_V_list.append(temp_list[2:-1])
+                        else:
+                            if temp.count('=') < 1 or temp_list[0] == '':
+                                raise ValueError('{}:{}: malformed [CONSONANT] entry (consonant=CV,...=flag): {}'.format(
+                                    filename, presamp_line_number(data, start) + k, temp.strip()))
+                            if V_list.count(temp_list[0]) == 0:
+                                C_list.append(temp_list[0])
+                            else:
+                                C_list.append(temp_list[0] + '#')
+                            CV_C_list.append(temp_list[1:-1])
+        return V_list, C_list, CV_V_list, CV_C_list
+
+    def build_inventory(self, V_list, C_list, CV_V_list, CV_C_list):
+        # 由presamp的内容生成CV、VC、VV列表
+        # 先遍历一次[CONSONANT]建立 字 -> 辅音 的对照表，每个字只查询一次；同一个字属于多个辅音时取最后一个，不属于任何辅音的字视为纯元音
+        # 音素名转换为编号
+        V_list = [self.symbols.intern(_v) for _v in V_list]
+        C_list = [self.symbols.intern(_c) for _c in C_list]
+        names = self.symbols.names
+        aliases = self.symbols.aliases
+        consonant_of = {}  # 字 -> 辅音
+        for k in range(0, len(C_list)):
+            _c = C_list[k]
+            for j in CV_C_list[k]:
+                _c_last = consonant_of.get(j)
+                if _c_last != None and _c_last != _c:
+                    claimants = self.multi_claimed.setdefault(j, [names[_c_last]])
+                    if names[_c] not in claimants:
+                        claimants.append(names[_c])
+                consonant_of[j] = _c
         for i in range(0, len(V_list)):
+            _v = V_list[i]
             for j in CV_V_list[i]:
-                l = l + 1
-                cv_now = cv(j, '', V_list[i], 'cv')
-                for k in range(0, len(C_list)):
-                    if j in CV_C_list[k]:
-                        cv_now.c = C_list[k]
-                if cv_now.c == '':
-                    cv_now.c = cv_now.v
-                self.cvlist.append(cv_now)
-                self.clist = C_list[:]
-                self.vlist = V_list[:]
-
-        for _c in self.clist:
-            for _v in self.vlist:
-                vc = cv(_v + ' ' + ''.join(_c).replace('#', ''), _c, _v, 'vc')
-                self.vclist.append(vc)
+                _c = consonant_of.get(j)
+                if _c == None:
+                    _c = _v
+                    if j != names[_v]:
+                        self.unclaimed.append(j)
+                self.cvlist.append(cv(j, _c, _v, 'cv'))
+        if len(self.cvlist) > 0:  # 没有任何CV时clist、vlist为空
+            self.clist = C_list[:]
+            self.vlist = V_list[:]
+        self.build_index()
 
+        # VC部为辅音与元音的所有组合
+        self.vclist.extend([cv(names[_v] + ' ' + aliases[_c], _c, _v, 'vc') for _c in self.clist for _v in self.vlist])
+        # 确保VV作为VC时C部分的元音有存在纯元音
+        head_cs = set([_cv.c for _cv in self.cvlist])
         for _v1 in self.vlist:
-            for _v2 in self.vlist:
-                if self.findcv_c(self.cvlist, _v1) != None:  # 确保VV作为VC时C部分的元音有存在纯元音
-                    vv = cv(_v2 + ' ' + _v1, _v1, _v2, 'vv')
-                    self.vvlist.append(vv)
-                else:
-                    break
+            if _v1 in head_cs:
+                self.vvlist.extend([cv(names[_v2] + ' ' + names[_v1], _v1, _v2, 'vv') for _v2 in self.vlist])
+        self.build_unit_index()
 
         if debug:
             read_result = codecs.open("read_result.txt", "w", encoding="UTF-8")
             read_result.write("clist:\r\n")
             for _c in self.clist:
-                read_result.write(_c + " ")
+                read_result.write(names[_c] + " ")
             read_result.write("\r\nvlist:\r\n")
             for _v in self.vlist:
-                read_result.write(_v + " ")
+                read_result.write(names[_v] + " ")
             read_result.write("\r\ncvlist:\r\n")
             for _cv in self.cvlist:
-                read_result.write(_cv.name + "=" + _cv.c + " " + _cv.v + "\r\n")
+                read_result.write(_cv.name + "=" + names[_cv.c] + " " + names[_cv.v] + "\r\n")
             read_result.write("\r\nvclist:\r\n")
             for _vc in self.vclist:
                 read_result.write(_vc.name + "\r\n")
@@ -124,58 +896,144 @@ class worker():
             for _vv in self.vvlist:
                 read_result.write(_vv.name + "\r\n")
 
-    def gen_CVVC(self, path='Reclist.txt', length=8, UsePlanB=True, CV_head=True, IncludeVV=True, UseUnderlineInReclist=True, otopath='oto.ini', OtoMaxOfSameCV=3, OtoMaxOfSameVC=3, preset_blank=float(1250), oto_bpm=float(130), DivideVCCV=True):
-        reclist = []  # List<List<cv>> 按行收录
-        vc_remained = self.vclist[:]  # 余下的VC部
-        vR_remained = self.vlist[:]  # 余下的V_R
+    def shuffled(self, seed):
+        # 返回按seed随机打乱音素顺序的副本（共用symbols），seed为0时返回自身
+        # 补全VC部时总是先取出列表中靠前的音素（“随便取出”），不同的顺序会得到不同的行数和增字数
+        # CV只在同一元音内打乱，保持Plan A遍历时按元音分组的顺序（完全打乱会使结果明显变差）
+        if seed == 0:
+            return self
+        rand = random.Random(seed)
+        shuffled_worker = worker()
+        shuffled_worker.symbols = self.symbols
+        shuffled_worker.clist = self.clist[:]
+        shuffled_worker.vlist = self.vlist[:]
+        shuffled_worker.multi_claimed = self.multi_claimed
+        shuffled_worker.unclaimed = self.unclaimed
+        cv_groups = collections.OrderedDict()
+        for _cv in self.cvlist:
+            cv_groups.setdefault(_cv.v, []).append(_cv)
+        for _v in cv_groups:
+            rand.shuffle(cv_groups[_v])
+            shuffled_worker.cvlist.extend(cv_groups[_v])
+        shuffled_worker.vclist = self.vclist[:]
+        shuffled_worker.vvlist = self.vvlist[:]
+        rand.shuffle(shuffled_worker.vclist)
+        rand.shuffle(shuffled_worker.vvlist)
+        shuffled_worker.build_index()
+        shuffled_worker.build_unit_index()
+        return shuffled_worker
 
+    def plan_CVVC(self, length=8, UsePlanB=True, CV_head=True, IncludeVV=True, gen_result=None, covered=None, planner='greedy'):
+        # 逐行生成录音表（每行为List<cv>），增字数等统计记录在gen_result中
+        # covered为count_units()的结果时，只生成覆盖其余音素所需的行（增量生成）
+        # planner为'graph'时用cover_graph()补全VC部，否则逐个贪心补全
+        if planner not in planners:
+            raise ValueError('unknown planner: ' + str(planner))
+        if gen_result == None:
+            gen_result = result()
+        self.counters = {}
+        # 各种行的行数，以及因增字而提前换行的次数
+        counters = gen_result.counters
+        for key in ('rows_plan_a', 'rows_plan_b', 'rows_vc', 'rows_cv_head', 'rows_not_head', 'rows_v_r', 'filler_breaks'):
+            counters.setdefault(key, 0)
+        vc_units = self.vclist[:]
         # 如果要求包含VV，则包含VV
         if IncludeVV == True:
-            vc_remained.extend(self.vvlist)
+            vc_units.extend(self.vvlist)
+        vc_remained = unitpool(vc_units, lambda _unit: _unit.v)  # 余下的VC部
+        vR_remained = unitpool(self.vlist)  # 余下的V_R
 
         if (not UsePlanB) and CV_head:
-            headcv_remained = self.cvlist[:]  # 余下的句首CV
+            headcv_remained = unitpool(self.cvlist, lambda _cv: _cv.v)  # 余下的句首CV
+
+        notheadcv_remained = unitpool(self.cvlist)  # 余下的句中CV
 
-        notheadcv_remained = self.cvlist[:]  # 余下的句中CV
+        if covered != None:
+            # 删除已经覆盖的音素，只遍历从未出现过的CV
+            for _unit in covered['vc']:
+                if _unit in vc_remained:
+                    vc_remained.remove(_unit)
+            for _v in covered['vR']:
+                if _v in vR_remained:
+                    vR_remained.remove(_v)
+            if (not UsePlanB) and CV_head:
+                for _cv in covered['head']:
+                    if _cv in headcv_remained:
+                        headcv_remained.remove(_cv)
+            for _cv in covered['nothead']:
+                if _cv in notheadcv_remained:
+                    notheadcv_remained.remove(_cv)
+            sweep = [_cv for _cv in self.cvlist if _cv not in covered['head'] and _cv not in covered['nothead']]
+        else:
+            sweep = self.cvlist
 
         if not UsePlanB:
             # 遍历CV部(Plan A)
-            row_total = int(len(self.cvlist) / length)
-            vc_count_inlastrow = len(self.cvlist) % length
+            # 增量生成时每行的第一个字重复写入一次（增字），使新增的字同时作为句首和句中出现，不必再为句中CV另外补充一行
+            repeat_head = covered != None and length > 1
+            per_row = length
+            if repeat_head:
+                per_row = length - 1
+            row_total = int(len(sweep) / per_row)
+            vc_count_inlastrow = len(sweep) % per_row
             if(vc_count_inlastrow != 0):
                 row_total += 1
             for i in range(0, row_total):
                 row = []
                 v_last = ''
-                for j in range(0, length):
-                    if(i * length + j == len(self.cvlist)):
+                for j in range(0, per_row):
+                    if(i * per_row + j == len(sweep)):
                         break
-                    cv_now = self.cvlist[i * length + j]
+                    cv_now = sweep[i * per_row + j]
+                    if j == 0 and repeat_head:
+                        row.append(cv_now)
+                        gen_result.fillers += 1
+                        if CV_head:
+                            headcv_remained.remove(cv_now)  # 删除已经出现的句首CV字
+                        v_last = cv_now.v
                     row.append(cv_now)
-                    if j == 0:
+                    if j == 0 and not repeat_head:
                         if CV_head:
                             headcv_remained.remove(cv_now)  # 删除已经出现的句首CV字
-                    elif notheadcv_remained.count(cv_now) > 0:
+                    elif cv_now in notheadcv_remained:
                         notheadcv_remained.remove(cv_now)  # 删除已经出现的句中CV字
-                    if(vc_remained.count(self.findcv(self.vclist, cv_now.c, v_last))):
+                    if(self.findcv(self.vclist, cv_now.c, v_last) in vc_remained):
                         vc_remained.remove(self.findcv(self.vclist, cv_now.c, v_last))  # 删除已经出现的VC部
                     v_last = cv_now.v
-                reclist.append(row)
+                gen_result.vc_remaining = len(vc_remained)
+                counters['rows_plan_a'] += 1
+                yield row
                 # 记录句尾V的出现
-                if(vR_remained.count(row[len(row) - 1].v) > 0):
+                if(row[len(row) - 1].v in vR_remained):
                     vR_remained.remove(row[len(row) - 1].v)
         else:
             # 遍历CV部(Plan B)
-            for cv_now in self.cvlist:
+            for cv_now in sweep:
                 row = []
                 row.append(cv_now)
                 row.append(cv_now)
                 row.append(cv_now)
-                if(vc_remained.count(self.findcv(self.vclist, cv_now.c, cv_now.v))):
+                if(self.findcv(self.vclist, cv_now.c, cv_now.v) in vc_remained):
                     vc_remained.remove(self.findcv(self.vclist, cv_now.c, cv_now.v))  # 删除已经出现的VC部
-                if(vc_remained.count(self.findcv(self.vvlist, cv_now.c, cv_now.v))):
+                if(self.findcv(self.vvlist, cv_now.c, cv_now.v) in vc_remained):
                     vc_remained.remove(self.findcv(self.vvlist, cv_now.c, cv_now.v))  # 删除已经出现的VV部
-                reclist.append(row)
+                gen_result.vc_remaining = len(vc_remained)
+                counters['rows_plan_b'] += 1
+                yield row
+
+        if planner == 'graph':
+            # 由cover_graph()补全VC部，无法覆盖的VC部（若有）仍由下面的贪心算法处理
+            if (not UsePlanB) and CV_head:
+                graph_head = headcv_remained
+            else:
+                graph_head = None
+            for row in self.cover_graph(vc_remained, length, graph_head, notheadcv_remained, gen_result):
+                gen_result.vc_remaining = len(vc_remained)
+                counters['rows_vc'] += 1
+                yield row
+                # 记录句尾V的出现
+                if(row[len(row) - 1].v in vR_remained):
+                    vR_remained.remove(row[len(row) - 1].v)
 
         # 补全VC部
         row = []  # 生成新行
@@ -185,49 +1043,50 @@ class worker():
         add_flag = 0  # 用于标记是否出现增字（浪费了一个VC部的机会）
         index_findcv_connective = 0  # 为寻找可接续的CV而设置的搜索指针
         # 为随意取CV时尽量平均而设置的搜索指针
-        index_random_findcv_c = []
-        for i in range(0, len(self.clist)):
-            index_random_findcv_c.append(0)
-        index_random_findcv_v = []
-        for i in range(0, len(self.vlist)):
-            index_random_findcv_v.append(0)
+        # 以C、V的编号为下标
+        index_random_findcv_c = [0] * len(self.symbols.names)
+        index_random_findcv_v = [0] * len(self.symbols.names)
 
         while len(vc_remained) > 0:  # 主循环
             if vc_wanted != None and count != 0:  # 非句首且不出现增字时
                 vc_remained.remove(vc_wanted)  # 取出将要写入的VC部
                 if vc_wanted.type != 'vv':
-                    index_findcv_connective = index_random_findcv_c[self.clist.index(vc_wanted.c)]
+                    index_findcv_connective = index_random_findcv_c[vc_wanted.c]
                 else:
                     index_findcv_connective = 0
             while True:  # 以CV字为单位的子循环
                 # 句首或者出现增字时，需要先写入一个与前文无关的CV字
                 if count == 0:  # 句首时
-                    vc_wanted = vc_remained[0]  # 随便取出一个VC部
+                    vc_wanted = vc_remained.first()  # 随便取出一个VC部
                     vc_remained.remove(vc_wanted)  # 移除
                     cv_now = None
                     if CV_head and not UsePlanB:
                         # 要求句首CV时，首先尝试写入一个以VC部的V结尾，且还未在句首出现过的CV字
-                        cv_now = self.findcv_v(headcv_remained, vc_wanted.v)
+                        cv_now = headcv_remained.first_with(vc_wanted.v)
                         if cv_now != None:
                             headcv_remained.remove(cv_now)  # 删除已经出现句首的CV字
                     if cv_now == None:
-                        cv_now = self.findcv_v(self.cvlist, vc_wanted.v, index_random_findcv_v[self.vlist.index(vc_wanted.v)], True)  # 写入一个以VC部的V结尾的CV字
-                        index_random_findcv_v[self.vlist.index(vc_wanted.v)] = self.cvlist.index(cv_now) + 1
+                        cv_now = self.findcv_v(self.cvlist, vc_wanted.v, index_random_findcv_v[vc_wanted.v], True)  # 写入一个以VC部的V结尾的CV字
+                        index_random_findcv_v[vc_wanted.v] = self.cv_pos[cv_now] + 1
                     row.append(cv_now)
                     count += 1
                 elif add_flag == 1:  # 出现增字的情况
                     if count + 1 == length:  # 如果加入增字会导致超出行长度，则先行换行
                         count = 0
-                        reclist.append(row)
+                        gen_result.vc_remaining = len(vc_remained)
+                        counters['rows_vc'] += 1
+                        counters['filler_breaks'] += 1
+                        yield row
                         # 记录句尾V的出现
-                        if(vR_remained.count(row[len(row) - 1].v) > 0):
+                        if(row[len(row) - 1].v in vR_remained):
                             vR_remained.remove(row[len(row) - 1].v)
                         row = []
-                    cv_now = self.findcv_v(self.cvlist, vc_wanted.v, index_random_findcv_v[self.vlist.index(vc_wanted.v)], True)  # 写入一个以VC部的V结尾的CV字（此字为增字，因为其C和前一个字的V组成的VC部已经不需要）
+                    cv_now = self.findcv_v(self.cvlist, vc_wanted.v, index_random_findcv_v[vc_wanted.v], True)  # 写入一个以VC部的V结尾的CV字（此字为增字，因为其C和前一个字的V组成的VC部已经不需要）
                     if count != 1:  # 如果前一个字是句首则已经写入过，所以不再写入
-                        index_random_findcv_v[self.vlist.index(vc_wanted.v)] = self.cvlist.index(cv_now) + 1
+                        index_random_findcv_v[vc_wanted.v] = self.cv_pos[cv_now] + 1
                         row.append(cv_now)
-                        if notheadcv_remained.count(cv_now) > 0 and count > 0:
+                        gen_result.fillers += 1
+                        if cv_now in notheadcv_remained and count > 0:
                             notheadcv_remained.remove(cv_now)  # 删除已经出现的句中CV字
                         count += 1
                     add_flag = 0
@@ -242,22 +1101,22 @@ class worker():
                 if cv_now == None:
                     # 先随意写入一个CV字来完成本轮的VC部，V是什么无所谓，因为没有能够接续下去的V
                     if vc_wanted.type != 'vv':
-                        cv_now = self.findcv_c(self.cvlist, vc_wanted.c, index_random_findcv_c[self.clist.index(vc_wanted.c)], True)
+                        cv_now = self.findcv_c(self.cvlist, vc_wanted.c, index_random_findcv_c[vc_wanted.c], True)
                     else:
                         cv_now = self.findcv_c(self.cvlist, vc_wanted.c)
                     add_flag = 1  # 点亮增字标记
                     if(len(vc_remained) > 0):
-                        vc_wanted = vc_remained[0]  # 随意取出一个下轮的VC部
+                        vc_wanted = vc_remained.first()  # 随意取出一个下轮的VC部
                     break  # 离开本轮子循环
 
                 # 检查搜索到的CV字是否符合要求
                 # 尝试找到下一个需要的VC部，使得其V与目前检索到的CV字的V相同（即能够接续）
-                vc_wanted_next = self.findcv_v(vc_remained, cv_now.v)
-                index_findcv_connective = self.cvlist.index(cv_now) + 1  # 记录搜索指针到达的位置
+                vc_wanted_next = vc_remained.first_with(cv_now.v)
+                index_findcv_connective = self.cv_pos[cv_now] + 1  # 记录搜索指针到达的位置
                 if vc_wanted_next != None:
                     # 如果找到了符合要求的VC部，则记录该VC部，并离开本轮子循环
                     if vc_wanted.type != 'vv':
-                        index_random_findcv_c[self.clist.index(vc_wanted.c)] = index_findcv_connective
+                        index_random_findcv_c[vc_wanted.c] = index_findcv_connective
                     vc_wanted = vc_wanted_next
                     break
 
@@ -268,49 +1127,53 @@ class worker():
             # 离开上述子循环的条件是：已经找到一个合适的CV字来写入（有可能在其之前还要再写入一个增字）
             if not cv_now == None:
                 row.append(cv_now)  # 写入该CV字
-                if notheadcv_remained.count(cv_now) > 0 and count > 0:
+                if cv_now in notheadcv_remained and count > 0:
                     notheadcv_remained.remove(cv_now)  # 删除已经出现的句中CV字
                 count += 1
 
             # 如果字数达到一句的长度，则换行
             if(count == length):
                 count = 0
-                reclist.append(row)
+                gen_result.vc_remaining = len(vc_remained)
+                counters['rows_vc'] += 1
+                yield row
                 # 记录句尾V的出现
-                if(vR_remained.count(row[len(row) - 1].v) > 0):
+                if(row[len(row) - 1].v in vR_remained):
                     vR_remained.remove(row[len(row) - 1].v)
                 row = []
 
         # 全部VC部用尽后，将最后一行未满的字写入
         if len(row) > 0:
-            reclist.append(row)
+            gen_result.vc_remaining = len(vc_remained)
+            counters['rows_vc'] += 1
+            yield row
             # 记录句尾V的出现
-            if(vR_remained.count(row[len(row) - 1].v) > 0):
+            if(row[len(row) - 1].v in vR_remained):
                 vR_remained.remove(row[len(row) - 1].v)
 
         if not UsePlanB:
             # 如果要求句首CV，则需要在最后单独补充
             if CV_head:
-                while True:
+                while len(headcv_remained) > 0:
                     row = []
                     i = 0
                     while i < length:
                         if len(headcv_remained) > 0:
-                            row.append(headcv_remained[0])
+                            row.append(headcv_remained.first())
                             # 记录句尾V的出现
-                            if(vR_remained.count(headcv_remained[0].v) > 0):
-                                vR_remained.remove(headcv_remained[0].v)
-                            headcv_remained.remove(headcv_remained[0])
+                            if(headcv_remained.first().v in vR_remained):
+                                vR_remained.remove(headcv_remained.first().v)
+                            headcv_remained.remove(headcv_remained.first())
                             i += 1
                         else:
                             break
                         if i < length:  # 隔一个字放置一个空拍
                             if i + 1 < length and len(headcv_remained) > 0:
-                                row.append(cv('blank', '', '', 'blank'))
+                                row.append(cv('blank', -1, -1, 'blank'))
                             i += 1
-                    reclist.append(row)
-                    if len(headcv_remained) == 0:
-                        break
+                    gen_result.vc_remaining = len(vc_remained)
+                    counters['rows_cv_head'] += 1
+                    yield row
 
             # 补充句中CV
             while len(notheadcv_remained)>0:
@@ -318,178 +1181,1254 @@ class worker():
                 i = 0
                 while i < length:
                     if len(notheadcv_remained) > 0:
-                        row.append(notheadcv_remained[0])
-                        notheadcv_remained.remove(notheadcv_remained[0])
+                        row.append(notheadcv_remained.first())
+                        notheadcv_remained.remove(notheadcv_remained.first())
                         i += 1
                     else:
                         break
-                reclist.append(row)
+                gen_result.vc_remaining = len(vc_remained)
+                counters['rows_not_head'] += 1
+                yield row
 
                 # 记录句尾V的出现
-                if(vR_remained.count(row[len(row) - 1].v) > 0):
+                if(row[len(row) - 1].v in vR_remained):
                     vR_remained.remove(row[len(row) - 1].v)
 
             # 补充V_R
             for v_R in vR_remained:
                 row = []
                 row.append(self.findcv_v(self.cvlist, v_R, 0, False))
-                reclist.append(row)
-
-        # 写入CVVC录音表文件
-        f_reclist = open(path, 'w', encoding='UTF-8')
-        reclist_text = []
-        for row in reclist:
-            text = '_'
-            for _cv in row:
-                if UseUnderlineInReclist and text != '_':
-                    text += '_'
-                if _cv.name != 'blank':
-                    text += _cv.name
+                gen_result.vc_remaining = len(vc_remained)
+                counters['rows_v_r'] += 1
+                yield row
+
+    def cover_graph(self, vc_remained, length, headcv_remained, notheadcv_remained, gen_result):
+        # 将元音视为节点、余下的VC部视为边，用尽量少的一笔画（Euler路径）覆盖所有边，再按行长度切分成行
+        # VC部(c, v)是从v出发的边，终点可以是任意一个以c开头的CV字的V，在建图时选择终点使各节点的出入度尽量平衡
+        # 一行写完一条路径后若还有空间，写入一个增字跳到下一条路径的起点，否则换行
+        # 覆盖的VC部从vc_remained中删除，同时删除headcv_remained、notheadcv_remained中出现的CV
+        cvlist = self.cvlist
+        # (C, V) -> 符合的CV在cvlist中的位置
+        cv_by_cv = {}
+        for i in range(0, len(cvlist)):
+            cv_by_cv.setdefault((cvlist[i].c, cvlist[i].v), []).append(i)
+        # 每条边：[起点V, 终点可选的V, VC部]，只有一个可选终点的边先定
+        edges = []
+        for _unit in vc_remained:
+            targets = sorted(set(cvlist[i].v for i in self.c_pos[_unit.c]))
+            if len(targets) > 0 and len(self.v_pos[_unit.v]) > 0:
+                edges.append((_unit.v, targets, _unit))
+        edges.sort(key=lambda _edge: len(_edge[1]))
+        balance = collections.Counter()  # 出度 - 入度
+        for _edge in edges:
+            balance[_edge[0]] += 1
+        adjacency = collections.defaultdict(list)  # V -> [(终点V, VC部)]
+        for v_from, targets, _unit in edges:
+            v_to = max(targets, key=lambda _v: balance[_v])
+            balance[v_to] -= 1
+            adjacency[v_from].append((v_to, _unit))
+
+        # 加入一个虚拟节点（None），连接出度多余与入度多余的节点，使每个连通分量都存在Euler回路
+        for _v in list(balance):
+            if balance[_v] > 0:
+                adjacency[None].extend([(_v, None)] * balance[_v])
+            elif balance[_v] < 0:
+                adjacency[_v].extend([(None, None)] * -balance[_v])
+
+        # Hierholzer算法求Euler回路，在虚拟节点处切分成路径
+        trails = []
+        for start in [None] + sorted(adjacency, key=lambda _v: -1 if _v == None else _v):
+            if not adjacency[start]:
+                continue
+            circuit = []
+            stack = [(start, None, None)]
+            while stack:
+                v_now = stack[-1][0]
+                if adjacency[v_now]:
+                    v_to, _unit = adjacency[v_now].pop()
+                    stack.append((v_to, v_now, _unit))
+                else:
+                    circuit.append(stack.pop())
+            circuit.reverse()
+            trail = []
+            for v_to, v_from, _unit in circuit[1:]:
+                if _unit == None:
+                    if trail:
+                        trails.append(trail)
+                    trail = []
                 else:
-                    if UseUnderlineInReclist:
-                        text += 'R'
+                    trail.append((v_from, v_to, _unit))
+            if trail:
+                trails.append(trail)
+
+        # 为尽量平均地使用CV字而设置的搜索指针
+        index_pick = collections.Counter()
+
+        def pick(positions, key, prefer):
+            # 从positions中轮流取出一个CV，优先取出prefer中还剩下的
+            start = index_pick[key]
+            for k in range(0, len(positions)):
+                _cv = cvlist[positions[(start + k) % len(positions)]]
+                if prefer != None and _cv in prefer:
+                    index_pick[key] = start + k + 1
+                    return _cv
+            index_pick[key] = start + 1
+            return cvlist[positions[start % len(positions)]]
+
+        def head(v):
+            # 句首写入一个以v结尾的CV字
+            cv_now = None
+            if headcv_remained != None:
+                cv_now = headcv_remained.first_with(v)
+                if cv_now != None:
+                    headcv_remained.remove(cv_now)  # 删除已经出现句首的CV字
+            if cv_now == None:
+                cv_now = pick(self.v_pos[v], ('v', v), None)
+            return cv_now
+
+        def append(row, cv_now):
+            # 写入一个句中的CV字
+            if len(row) > 0:
+                _unit = self.findcv(self.vclist, cv_now.c, row[len(row) - 1].v)
+                if _unit == None:
+                    _unit = self.findcv(self.vvlist, cv_now.c, row[len(row) - 1].v)
+                if _unit != None and _unit in vc_remained:
+                    vc_remained.remove(_unit)
+                if cv_now in notheadcv_remained:
+                    notheadcv_remained.remove(cv_now)  # 删除已经出现的句中CV字
+            row.append(cv_now)
+
+        row = []
+        for trail in trails:
+            for v_from, v_to, _unit in trail:
+                if len(row) == 0:
+                    row.append(head(v_from))
+                elif row[len(row) - 1].v != v_from:
+                    if len(row) + 2 <= length:
+                        # 写入一个以v_from结尾的增字
+                        append(row, pick(self.v_pos[v_from], ('v', v_from), notheadcv_remained))
+                        gen_result.fillers += 1
+                    else:
+                        yield row
+                        row = [head(v_from)]
+                append(row, pick(cv_by_cv[(_unit.c, v_to)], (_unit.c, v_to), notheadcv_remained))
+                if len(row) == length:
+                    yield row
+                    row = []
+        if len(row) > 0:
+            yield row
+
+    def render_row(self, row, UseUnderlineInReclist=True):
+        # 将一行转换为录音表中的文本
+        text = '_'
+        for _cv in row:
+            if UseUnderlineInReclist and text != '_':
+                text += '_'
+            if _cv.name != 'blank':
+                text += _cv.name
+            else:
+                if UseUnderlineInReclist:
+                    text += 'R'
+                else:
+                    text += '_'
+        return text
+
+    def split_reclist(self, text, UseUnderlineInReclist=True, ambiguous=None):
+        # 将录音表中的一行切分为音素名的列表，空拍为'R'（render_row()的逆操作）
+        # 不使用下划线时每个'_'为一个空拍，其余部分用前缀树按最长匹配切分
+        # 能以多种方式完整切分的部分仍按最长匹配切分，给出ambiguous（列表）时将(原文, 各种切分方式)加入其中
+        if UseUnderlineInReclist:
+            return text[1:].split('_')
+        if self.syllables == None:
+            self.syllables = trie([_cv.name for _cv in self.cvlist])
+        names = []
+        chunks = text[1:].split('_')
+        for k in range(0, len(chunks)):
+            if k > 0:
+                names.append('R')
+            found = self.syllables.readings(chunks[k])
+            if len(found) == 0:
+                names.extend(self.syllables.split(chunks[k]))
+                continue
+            names.extend(found[0])
+            if len(found) > 1 and ambiguous != None:
+                ambiguous.append((chunks[k], found))
+        return names
+
+    def read_reclist(self, filename='Reclist.txt', UseUnderlineInReclist=True):
+        # 读取已有的录音表，返回[(录音表中的一行, List<cv>)]
+        # R转换为空拍，当前presamp中不存在的字转换为种类为'unknown'的cv（名称为原文）
+        # 同名的字取presamp中第一个定义；有多种切分方式的部分记录在self.ambiguous_splits中
+        cv_names = {}
+        for _cv in self.cvlist:
+            cv_names.setdefault(_cv.name, _cv)
+        self.ambiguous_splits = []
+        rows = []
+        with open(filename, 'r', encoding='UTF-8') as f:
+            for text in f:
+                text = text.rstrip('\r\n')
+                if text == '':
+                    continue
+                if not text.startswith('_'):
+                    raise ValueError('not a reclist line: ' + text)
+                row = []
+                ambiguous = []
+                for _name in self.split_reclist(text, UseUnderlineInReclist, ambiguous):
+                    if _name == 'R':
+                        row.append(cv('blank', -1, -1, 'blank'))
+                    elif _name in cv_names:
+                        row.append(cv_names[_name])
                     else:
-                        text += '_'
-            reclist_text.append(text)
-            f_reclist.write(text + "\n")
-
-        # 写入oto文件
-        f_oto = open(otopath, 'w', encoding='UTF-8')
-        exist_list_cv = []
-        exist_list_vc = []
-        ticks = float(60) / oto_bpm * float(1000)
-        vc_list_temp = []
-        repeat_list = []
-        for i in range(0, len(reclist)):
-            row_text = reclist_text[i] + ".wav="
-            row = reclist[i]
-            count = 0
-            row_count = 0
-            cv_last = None
-            for _cv in row:
-                if _cv.name == 'blank':
-                    count = count + 1
-                    cv_last = None
+                        row.append(cv(_name, -1, -1, 'unknown'))
+                for chunk, found in ambiguous:
+                    self.ambiguous_splits.append((len(rows) + 1, chunk, [' '.join(reading) for reading in found]))
+                rows.append((text, row))
+        return rows
+
+    def has_unknown(self, row):
+        # 一行中是否含有presamp中不存在的字
+        for _cv in row:
+            if _cv.type == 'unknown':
+                return True
+        return False
+
+    def row_units(self, row):
+        # 逐个返回一行覆盖的(种类, 音素)：种类为句首CV 'head'、句中CV 'nothead'、VC部（含VV）'vc'以及V_R 'vR'
+        # 与otowriter一致，前面紧接着一个CV字时才是句中CV（oto中为“x”），否则为句首CV（oto中为“- x”）
+        cv_last = None
+        for _cv in row:
+            if _cv.type != 'cv':
+                cv_last = None
+                continue
+            if cv_last == None:
+                yield 'head', _cv
+            else:
+                yield 'nothead', _cv
+                _unit = self.vc_map.get((_cv.c, cv_last.v))
+                if _unit == None:
+                    _unit = self.vv_map.get((_cv.c, cv_last.v))
+                if _unit != None:
+                    yield 'vc', _unit
+            cv_last = _cv
+        if cv_last != None:
+            yield 'vR', cv_last.v
+
+    def count_units(self, rows):
+        # 统计已有各行覆盖的音素，返回种类 -> 音素的集合（种类见row_units()）
+        # 与plan_CVVC补充句中CV时一致，行首的CV也算作已经排列的句中CV（已知的缺口，见coverage），不再补充一次
+        covered = {'head': set(), 'nothead': set(), 'vc': set(), 'vR': set()}
+        for row in rows:
+            if len(row) > 0 and row[0].type == 'cv':
+                covered['nothead'].add(row[0])
+            for kind, _unit in self.row_units(row):
+                covered[kind].add(_unit)
+        return covered
+
+    def diff_inventory(self, old_worker):
+        # 比较新旧presamp的音素，返回种类 -> (新增, 删除)
+        diff = {}
+        for kind, units in (('CV', lambda _worker: [_cv.name + '=' + _worker.symbols.names[_cv.c] + ' ' + _worker.symbols.names[_cv.v] for _cv in _worker.cvlist]),
+                            ('VC', lambda _worker: [_vc.name for _vc in _worker.vclist]),
+                            ('VV', lambda _worker: [_vv.name for _vv in _worker.vvlist]),
+                            ('V_R', lambda _worker: [_worker.symbols.names[_v] + ' R' for _v in _worker.vlist])):
+            new_units = units(self)
+            old_units = units(old_worker)
+            old_set = set(old_units)
+            new_set = set(new_units)
+            diff[kind] = ([_unit for _unit in new_units if _unit not in old_set], [_unit for _unit in old_units if _unit not in new_set])
+        return diff
+
+    def timed(self, rows, gen_result):
+        # 逐行取出排列结果，并将排列本身的耗时累计到timing['plan']
+        rows = iter(rows)
+        while True:
+            with measure(gen_result.timing, None, 'plan'):
+                row = next(rows, None)
+            if row == None:
+                return
+            yield row
+
+    def reporter(self, gen_result, progress=None, cancel=None):
+        # 返回用于报告进度（阶段, 已生成行数, 余下的VC部数）的函数，要求取消时中止
+        def report(phase):
+            if cancel != None and cancel.is_set():
+                raise cancelled()
+            if progress != None:
+                progress(phase, gen_result.rows, gen_result.vc_remaining)
+        return report
+
+    def gen_CVVC(self, path='Reclist.txt', length=8, UsePlanB=True, CV_head=True, IncludeVV=True, UseUnderlineInReclist=True, otopath='oto.ini', OtoMaxOfSameCV=3, OtoMaxOfSameVC=3, preset_blank=float(1250), oto_bpm=float(130), DivideVCCV=True, repeatpath='', progress=None, cancel=None, planner='greedy', oto_timing=None, dbpath=''):
+        gen_result = result()
+        report = self.reporter(gen_result, progress, cancel)
+        oto = otowriter(self.symbols, UsePlanB, OtoMaxOfSameCV, OtoMaxOfSameVC, preset_blank, oto_bpm, oto_timing)
+        checker = coverage(self, UsePlanB, CV_head, IncludeVV)
+
+        def lines():
+            # 每生成一行就立即交给write_CVVC写入录音表和oto
+            for row in self.timed(self.plan_CVVC(length, UsePlanB, CV_head, IncludeVV, gen_result, None, planner), gen_result):
+                gen_result.rows += 1
+                report('plan')
+                text = self.render_row(row, UseUnderlineInReclist)
+                checker.add(text, row)
+                yield text, row, oto.with_beats(oto.entries(text, row))
+
+        self.write_CVVC(lines(), oto, path, otopath, repeatpath, DivideVCCV, gen_result, report, dbpath)
+        gen_result.coverage = checker.report()
+        return gen_result
+
+    def update_CVVC(self, path='Reclist.txt', length=8, UsePlanB=True, CV_head=True, IncludeVV=True, UseUnderlineInReclist=True, otopath='oto.ini', OtoMaxOfSameCV=3, OtoMaxOfSameVC=3, preset_blank=float(1250), oto_bpm=float(130), DivideVCCV=True, repeatpath='', progress=None, cancel=None, planner='greedy', oto_timing=None, dbpath=''):
+        # 增量生成：保留已有录音表的各行，只在末尾追加覆盖新增音素所需的行
+        # 已有行的oto条目与重新生成的别名相同时保留原条目（包括手动调整过的数值），否则替换为重新生成的条目
+        if not UseUnderlineInReclist:
+            raise ValueError('incremental generation needs a reclist with underbars')
+        gen_result = result()
+        report = self.reporter(gen_result, progress, cancel)
+        old_rows = self.read_reclist(path)
+        if os.path.exists(otopath):
+            old_oto = read_oto(otopath)
+        else:
+            old_oto = {}
+        covered = self.count_units([row for text, row in old_rows])
+        oto = otowriter(self.symbols, UsePlanB, OtoMaxOfSameCV, OtoMaxOfSameVC, preset_blank, oto_bpm, oto_timing)
+        checker = coverage(self, UsePlanB, CV_head, IncludeVV)
+        known = None  # 当前presamp可以生成的别名，有需要保留原条目的行时才建立
+
+        def lines():
+            nonlocal known
+            for text, row in old_rows:
+                gen_result.rows += 1
+                report('plan')
+                checker.add(text, row)
+                old_lines = old_oto.pop(text, [])
+                if self.has_unknown(row):
+                    # 含有已删除的字，无法重新生成，保留原条目；其别名计入计数，之后的行不再使用相同的编号
+                    if known == None:
+                        known = self.oto_aliases()
+                    for line in old_lines:
+                        oto.reserve(line, known)
+                    yield text, row, [(oto_kind(line), line, None) for line in old_lines]
                     continue
-                # VC
-                text = row_text
-                if cv_last != None:
-                    _name = cv_last.v + ' ' + _cv.c.replace('#', '')
+                entries = list(oto.with_beats(oto.entries(text, row)))
+                kinds = {}
+                beats = {}
+                for kind, entry, beat in entries:
+                    kinds[oto_alias(entry)] = kind
+                    beats[oto_alias(entry)] = beat
+                if sorted([oto_alias(line) for line in old_lines]) == sorted(kinds):
+                    yield text, row, [(kinds[oto_alias(line)], line, beats[oto_alias(line)]) for line in old_lines]
                 else:
-                    _name = None
-                if _name != None:
-                    if OtoMaxOfSameVC == -1 or exist_list_vc.count(_name) < OtoMaxOfSameVC:
-                        text += _name
-                        if exist_list_vc.count(_name) > 0:
-                            text += str(exist_list_vc.count(_name) + 1)
-                            if exist_list_vc.count(_name) == 1:
-                                repeat_list.append(_name + ',' + str(exist_list_vc.count(_name) + 1) + '\n')
-                            else:
-                                repeat_list.remove(_name + ',' + str(exist_list_vc.count(_name)) + '\n')
-                                repeat_list.append(_name + ',' + str(exist_list_vc.count(_name) + 1) + '\n')
-                        text += ',' + \
-                            "{:.1f}".format(preset_blank - 0.5 * ticks + float(count) * ticks)
-                        text += ',' + "{:.1f}".format(0.65 * ticks)
-                        text += ',' + "{:.1f}".format(-1 * ticks)
-                        text += ',' + "{:.1f}".format(0.5 * ticks)
-                        text += ',' + "{:.1f}".format(0.5 * ticks / float(3))
-                        if DivideVCCV:
-                            vc_list_temp.append(text + '\n')
-                        else:
-                            f_oto.write(text + "\n")
-                        exist_list_vc.append(_name)
+                    yield text, row, entries
+            for row in self.timed(self.plan_CVVC(length, UsePlanB, CV_head, IncludeVV, gen_result, covered, planner), gen_result):
+                gen_result.rows += 1
+                gen_result.added_rows += 1
+                report('plan')
+                text = self.render_row(row, UseUnderlineInReclist)
+                checker.add(text, row)
+                yield text, row, oto.with_beats(oto.entries(text, row))
+            # 不属于录音表的条目原样保留
+            for wav in old_oto:
+                yield None, None, [(oto_kind(line), line, None) for line in old_oto[wav]]
 
-                # CV
-                text = row_text
-                if cv_last:
-                    _name = _cv.name
+        self.write_CVVC(lines(), oto, path, otopath, repeatpath, DivideVCCV, gen_result, report, dbpath)
+        gen_result.coverage = checker.report()
+        return gen_result
+
+    def oto_aliases(self):
+        # 返回按当前presamp可以生成的所有别名（不含编号）：CV（句首、句中及Plan B的“_L”）、VC以及V_R
+        known = set()
+        for _cv in self.cvlist:
+            for _name in (_cv.name, '- ' + _cv.name):
+                known.add(_name)
+                known.add(_name + '_L')
+        for _unit in self.vclist + self.vvlist:
+            known.add(_unit.name)
+        for _v in self.vlist:
+            known.add(self.symbols.names[_v] + ' R')
+        return known
+
+    def oto_CVVC(self, path='Reclist.txt', UsePlanB=True, CV_head=True, IncludeVV=True, UseUnderlineInReclist=True, otopath='oto.ini', OtoMaxOfSameCV=3, OtoMaxOfSameVC=3, preset_blank=float(1250), oto_bpm=float(130), DivideVCCV=True, repeatpath='', progress=None, cancel=None, oto_timing=None, dbpath='', StrictSplit=False):
+        # 只生成oto：读取已有（已录音）的录音表，不重新排列，按当前的oto设置重新生成全部条目，录音表本身不改动
+        # 不使用下划线的录音表用前缀树按最长匹配切分（见split_reclist()）；含有presamp中不存在的字时报错
+        # 有多种切分方式的部分记录在检查结果中（coverage.report()的'unsplit'），StrictSplit为True时报错
+        gen_result = result()
+        report = self.reporter(gen_result, progress, cancel)
+        rows = self.read_reclist(path, UseUnderlineInReclist)
+        unknown = []
+        for k in range(0, len(rows)):
+            for _cv in rows[k][1]:
+                if _cv.type == 'unknown':
+                    unknown.append('{}:{}: {}'.format(path, k + 1, _cv.name))
+        if len(unknown) > 0:
+            raise ValueError('syllables not in presamp: ' + ', '.join(unknown[:20]) + (' ...' if len(unknown) > 20 else ''))
+        if StrictSplit and len(self.ambiguous_splits) > 0:
+            ambiguous = ['{}:{}: {} ({})'.format(path, line, chunk, ' / '.join(found)) for line, chunk, found in self.ambiguous_splits]
+            raise ValueError('parts of the reclist can be split into syllables in more than one way (use underbars): ' + ', '.join(ambiguous[:20]) + (' ...' if len(ambiguous) > 20 else ''))
+        oto = otowriter(self.symbols, UsePlanB, OtoMaxOfSameCV, OtoMaxOfSameVC, preset_blank, oto_bpm, oto_timing)
+        checker = coverage(self, UsePlanB, CV_head, IncludeVV)
+        checker.unsplit = self.ambiguous_splits
+
+        def lines():
+            for text, row in rows:
+                gen_result.rows += 1
+                report('oto')
+                checker.add(text, row)
+                yield text, row, oto.with_beats(oto.entries(text, row))
+
+        self.write_CVVC(lines(), oto, '', otopath, repeatpath, DivideVCCV, gen_result, report, dbpath)
+        gen_result.counters['reclist_ambiguous_splits'] = len(self.ambiguous_splits)
+        gen_result.coverage = checker.report()
+        return gen_result
+
+    def write_CVVC(self, lines, oto, path, otopath, repeatpath, DivideVCCV, gen_result, report, dbpath=''):
+        # 写入录音表、oto和repeat文件，lines依次给出(录音表中的一行, List<cv>, 该行的(种类, oto条目, 所在的拍))
+        # path为''时不写入录音表；给出dbpath时同时将排列和oto条目写入SQLite数据库（见plandb）
+        if debug and repeatpath == '':
+            repeatpath = 'repeat.txt'
+
+        # 先写入临时文件，全部写完后再替换目标文件，以免取消或出错时留下写了一半的文件
+        paths = [otopath]
+        if path != '':
+            paths.append(path)
+        if repeatpath != '':
+            paths.append(repeatpath)
+        temp_paths = [_path + '.part' for _path in paths]
+        database = None
+        try:
+            if dbpath != '':
+                database = plandb(dbpath, self)
+            with contextlib.ExitStack() as stack:
+                f_oto = stack.enter_context(open(temp_paths[0], 'w', encoding='UTF-8', buffering=write_buffer_size))
+                f_reclist = None
+                if path != '':
+                    f_reclist = stack.enter_context(open(temp_paths[1], 'w', encoding='UTF-8', buffering=write_buffer_size))
+                if DivideVCCV:
+                    # VC部的条目先写入临时文件，最后接在CV部之后
+                    f_vc = stack.enter_context(tempfile.TemporaryFile('w+', encoding='UTF-8', buffering=write_buffer_size))
                 else:
-                    _name = "- " + _cv.name
-
-                if UsePlanB and row_count == 2 and len(row) == 3:
-                    _name = _name + "_L"
-
-                if OtoMaxOfSameCV == -1 or exist_list_cv.count(_name) < OtoMaxOfSameCV:
-                    text += _name
-                    repeat_time = ''
-                    if exist_list_cv.count(_name) > 0:
-                        repeat_time = str(exist_list_cv.count(_name) + 1)
-                        text += repeat_time
-                        if exist_list_cv.count(_name) == 1:
-                            repeat_list.append(_name + ',' + str(exist_list_cv.count(_name) + 1) + '\n')
+                    f_vc = f_oto
+                for text, row, entries in lines:
+                    row_id = None
+                    if text != None:  # 为None时只写入oto条目
+                        if f_reclist != None:
+                            f_reclist.write(text + "\n")
+                        if database != None:
+                            row_id = database.add_row(text, row)
+                    for kind, entry, beat in entries:
+                        if kind == 'cv':
+                            f_oto.write(entry + "\n")
                         else:
-                            repeat_list.remove(_name + ',' + str(exist_list_cv.count(_name)) + '\n')
-                            repeat_list.append(_name + ',' + str(exist_list_cv.count(_name) + 1) + '\n')
-                    text += ',' + \
-                        "{:.1f}".format(preset_blank - 0.1 * ticks + float(count) * ticks)
-                    text += ',' + "{:.1f}".format(0.3 * ticks)
-                    text += ',' + "{:.1f}".format(float(-0.7) * ticks)
-                    text += ',' + "{:.1f}".format(0.1 * ticks)
-                    text += ',' + "{:.1f}".format(0.1 * ticks / float(3))
-                    f_oto.write(text + "\n")
-                    exist_list_cv.append(_name)
-
-                cv_last = _cv
-                count += 1
-                row_count += 1
-
-            # V_R
-            text = row_text
-            _name = cv_last.v + ' R'
-            if OtoMaxOfSameVC == -1 or exist_list_vc.count(_name) < OtoMaxOfSameVC:
-                text += _name
-                if exist_list_vc.count(_name) > 0:
-                    text += str(exist_list_vc.count(_name) + 1)
-                    if exist_list_vc.count(_name) == 1:
-                        repeat_list.append(_name + ',' + str(exist_list_vc.count(_name) + 1) + '\n')
-                    else:
-                        repeat_list.remove(_name + ',' + str(exist_list_vc.count(_name)) + '\n')
-                        repeat_list.append(_name + ',' + str(exist_list_vc.count(_name) + 1) + '\n')
-                text += ',' + \
-                    "{:.1f}".format(preset_blank - 0.5 * ticks + float(count) * ticks)
-                text += ',' + "{:.1f}".format(0.65 * ticks)
-                text += ',' + "{:.1f}".format(-1 * ticks)
-                text += ',' + "{:.1f}".format(0.5 * ticks)
-                text += ',' + "{:.1f}".format(0.5 * ticks / float(3))
+                            f_vc.write(entry + "\n")
+                        if database != None:
+                            database.add_entry(row_id, beat, kind, entry)
+                        gen_result.oto_count += 1
                 if DivideVCCV:
-                    vc_list_temp.append(text + '\n')
+                    report('oto')
+                    f_vc.seek(0)
+                    shutil.copyfileobj(f_vc, f_oto)
+            gen_result.repeat = oto.repeat()
+            gen_result.counters.update(self.counters)
+            gen_result.counters['oto_dropped_cv'] = oto.dropped_cv
+            gen_result.counters['oto_dropped_vc'] = oto.dropped_vc
+            if repeatpath != '':
+                # 写入repeat文件
+                with open(temp_paths[len(temp_paths) - 1], 'w', encoding='UTF-8') as f_repeat:
+                    for _name in gen_result.repeat:
+                        f_repeat.write(_name + ',' + str(gen_result.repeat[_name]) + '\n')
+            if database != None:
+                database.close({'version': version, 'rows': gen_result.rows, 'oto_count': gen_result.oto_count, 'fillers': gen_result.fillers})
+        except BaseException:
+            if database != None:
+                database.abort()
+            for temp_path in temp_paths:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            raise
+        for k in range(0, len(paths)):
+            os.replace(temp_paths[k], paths[k])
+
+
+class coverage:
+    # 逐行检查录音表是否覆盖presamp中的所有音素：句首CV、句中CV、VC、VV以及V_R
+    # 每行只处理一次，各种音素以集合及计数记录，最后一次性比较
+    # track_rows为True时（检查已有的录音表）另外记录各行，以找出重复的行和多余的行；生成时的自动检查不记录，内存不随行数增长
+    kinds = ('CV_head', 'CV', 'VC', 'VV', 'V_R')
+    unit_kinds = {'CV_head': 'head', 'CV': 'nothead', 'VC': 'vc', 'VV': 'vc', 'V_R': 'vR'}  # 种类 -> row_units()中的种类
+
+    def __init__(self, my_worker, UsePlanB=False, CV_head=True, IncludeVV=True, track_rows=False):
+        self.worker = my_worker
+        self.track_rows = track_rows
+        # 种类 -> 需要覆盖的音素（按presamp中的顺序）
+        self.wanted = {
+            'CV_head': my_worker.cvlist if (not UsePlanB) and CV_head else [],
+            'CV': my_worker.cvlist,
+            'VC': my_worker.vclist,
+            'VV': my_worker.vvlist if IncludeVV else [],
+            'V_R': my_worker.vlist,
+        }
+        self.covered = {'head': set(), 'nothead': set(), 'vc': set(), 'vR': set()}  # row_units()中的种类 -> 已经覆盖的音素
+        # 记录各行时以row_units()返回的(种类, 音素)记录，每行只需一次集合运算
+        self.wanted_units = set()
+        if track_rows:
+            for kind in self.kinds:
+                for _unit in self.wanted[kind]:
+                    self.wanted_units.add((self.unit_kinds[kind], _unit))
+        self.counts = collections.Counter()  # (种类, 音素) -> 覆盖该音素的行数（track_rows为True时）
+        self.rows = 0
+        self.row_units = []  # 各行覆盖的需要的音素（track_rows为True时）
+        self.unknown = []  # (行号, 字)：presamp中不存在的字
+        self.unsplit = []  # (行号, 原文, 各种切分方式)：不使用下划线的录音表中有多种切分方式、按最长匹配读取的部分（只作提示）
+        self.row_first = set()  # 在某行第一个字出现过的CV
+        self.duplicates = []  # (行号, 相同的前一行的行号)
+        self.first_line = {}  # 录音表中的一行 -> 第一次出现的行号（track_rows为True时）
+        # presamp中属于多个元音的字名：从录音表读取时只能识别为第一个
+        name_count = collections.Counter(_cv.name for _cv in my_worker.cvlist)
+        self.ambiguous = [_name for _name in name_count if name_count[_name] > 1]
+
+    def add(self, text, row):
+        # 加入一行（text为录音表中的一行，row为List<cv>，presamp中不存在的字的种类为'unknown'）
+        self.rows += 1
+        line = self.rows
+        if self.track_rows:
+            if text in self.first_line:
+                self.duplicates.append((line, self.first_line[text]))
+            else:
+                self.first_line[text] = line
+        if len(row) > 0 and row[0].type == 'cv':
+            self.row_first.add(row[0])
+        for _cv in row:
+            if _cv.type == 'unknown':
+                self.unknown.append((line, _cv.name))
+        units = list(self.worker.row_units(row))
+        for kind, _unit in units:
+            self.covered[kind].add(_unit)
+        if self.track_rows:
+            units = self.wanted_units.intersection(units)
+            self.counts.update(units)
+            self.row_units.append(units)
+
+    def unit_name(self, kind, _unit):
+        if kind == 'V_R':
+            return self.worker.symbols.names[_unit] + ' R'
+        return _unit.name
+
+    def report(self):
+        # 返回检查结果（可转换为JSON）：各种类的覆盖数、缺少的音素、不存在的字、重复的行以及多余的行，以及presamp中可疑的字
+        # 多余的行指其中每个需要的音素都在其他行中出现过的行，单独删除其中任何一行都不影响覆盖
+        # 只在行首出现的CV没有句中的“x”，列为已知的缺口（Plan A补充句中CV的各行的第一个字），不算作缺少
+        missing = {}
+        known = {}
+        covered = {}
+        for kind in self.kinds:
+            missing[kind] = []
+            known[kind] = []
+            for _unit in self.wanted[kind]:
+                if _unit in self.covered[self.unit_kinds[kind]]:
+                    continue
+                if kind == 'CV' and _unit in self.row_first:
+                    known[kind].append(self.unit_name(kind, _unit))
                 else:
-                    f_oto.write(text + "\n")
-                exist_list_vc.append(_name)
+                    missing[kind].append(self.unit_name(kind, _unit))
+            covered[kind] = len(self.wanted[kind]) - len(missing[kind]) - len(known[kind])
+        redundant = []
+        for k in range(0, len(self.row_units)):
+            if all(self.counts[_unit] > 1 for _unit in self.row_units[k]):
+                redundant.append(k + 1)
+        return {
+            'rows': self.rows,
+            'complete': all(len(missing[kind]) == 0 for kind in self.kinds) and len(self.unknown) == 0,
+            'covered': covered,
+            'wanted': {kind: len(self.wanted[kind]) for kind in self.kinds},
+            'missing': missing,
+            'known_gaps': known,
+            'unsplit': [list(item) for item in self.unsplit],
+            'unknown': [list(item) for item in self.unknown],
+            'duplicate_rows': [list(item) for item in self.duplicates],
+            'redundant_rows': redundant,
+            'ambiguous': self.ambiguous,
+            'multi_claimed': self.worker.multi_claimed,
+            'unclaimed': self.worker.unclaimed,
+        }
 
-        if DivideVCCV:
-            f_oto.writelines(vc_list_temp)
 
-        if debug:
-            # 写入repeat文件
-            f_repeat = open('repeat.txt', 'w', encoding='UTF-8')
-            f_repeat.writelines(repeat_list)
-        return
+def verify(input_path='presamp.ini', reclist_path='Reclist.txt', use_planb=False, include_CV_head=True, include_VV=True, use_cache=True, use_underbar=True):
+    # 检查已有的录音表（可以是手动修改过的）是否覆盖presamp中的所有音素，返回coverage.report()的结果
+    my_worker = worker()
+    my_worker.load_presamp(input_path, use_cache)
+    checker = coverage(my_worker, use_planb, include_CV_head, include_VV, True)
+    for text, row in my_worker.read_reclist(reclist_path, use_underbar):
+        checker.add(text, row)
+    checker.unsplit = my_worker.ambiguous_splits
+    return checker.report()
 
 
-# 读取配置文件
-import configparser
-config = configparser.ConfigParser()
-config.read('reclist-gen-cvvc.ini', encoding='UTF-8')
-
-# RECLIST部分
-_input_path = config['RECLIST']['input_path']
-_reclist_output_path = config['RECLIST']['reclist_output_path']
-_length = int(config['RECLIST']['length'])
-_include_CV_head = config['RECLIST']['include_CV_head'] == 'True'
-_include_VV = config['RECLIST']['include_VV'] == 'True'
-_use_underbar = config['RECLIST']['use_underbar'] == 'True'
-_use_planb = config['RECLIST']['use_planb'] == 'True'
-
-# OTOSET部分
-_oto_output_path = config['OTOSET']['oto_output_path']
-_oto_max_of_same_cv = int(config['OTOSET']['oto_max_of_same_cv'])
-_oto_max_of_same_vc = int(config['OTOSET']['oto_max_of_same_vc'])
-_oto_preset_blank = int(config['OTOSET']['oto_preset_blank'])
-_oto_bpm = int(config['OTOSET']['oto_bpm'])
-_oto_divide_vccv = config['OTOSET']['oto_devide_vccv'] == 'True'
-
-my_worker = worker()
-my_worker.read_presamp(_input_path)
-my_worker.gen_CVVC(_reclist_output_path, _length, _use_planb, _include_CV_head, _include_VV,
-                   _use_underbar, _oto_output_path, _oto_max_of_same_cv, _oto_max_of_same_vc, _oto_preset_blank, _oto_bpm, _oto_divide_vccv)
+def format_coverage(report, limit=20):
+    # 生成检查结果的说明，每种问题最多列出limit项
+    def listed(items):
+        text = ', '.join(str(item) for item in items[:limit])
+        if len(items) > limit:
+            text += ', ... (+{})'.format(len(items) - limit)
+        return text
+
+    state = 'complete' if report['complete'] else 'INCOMPLETE'
+    known = sum(len(names) for names in report.get('known_gaps', {}).values())
+    if known > 0:
+        state += ' ({} known gaps)'.format(known)
+    lines = ['{} rows, {}'.format(report['rows'], state)]
+    for kind in coverage.kinds:
+        line = '{:<8} {:>6}/{}'.format(kind, report['covered'][kind], report['wanted'][kind])
+        if len(report['missing'][kind]) > 0:
+            line += '  missing: ' + listed(report['missing'][kind])
+        if len(report.get('known_gaps', {}).get(kind, [])) > 0:
+            line += '  known gap (only first in a row, no "x" alias): ' + listed(report['known_gaps'][kind])
+        lines.append(line)
+    if len(report['unknown']) > 0:
+        lines.append('unknown: ' + listed(['{}@{}'.format(name, line) for line, name in report['unknown']]))
+    if len(report.get('unsplit', [])) > 0:
+        lines.append('split in more than one way (read by longest match, use underbars for an exact split): ' + listed(['{}@{}'.format(chunk, line) for line, chunk, found in report['unsplit']]))
+    if len(report['duplicate_rows']) > 0:
+        lines.append('duplicate rows: ' + listed(['{}={}'.format(line, first) for line, first in report['duplicate_rows']]))
+    if len(report['redundant_rows']) > 0:
+        lines.append('redundant rows: ' + listed(report['redundant_rows']))
+    if len(report['ambiguous']) > 0:
+        lines.append('ambiguous names (read as the first definition): ' + listed(report['ambiguous']))
+    multi_claimed = report.get('multi_claimed', {})
+    if len(multi_claimed) > 0:
+        lines.append('syllables under several consonants (the last one is used): ' + listed(['{} ({})'.format(name, '/'.join(multi_claimed[name])) for name in multi_claimed]))
+    if len(report.get('unclaimed', [])) > 0:
+        lines.append('syllables under no consonant (read as vowels): ' + listed(report['unclaimed']))
+    return '\n'.join(lines)
+
+
+def read_config(filename='reclist-gen-cvvc.ini'):
+    # 读取配置文件，返回generate()的参数
+    config = configparser.ConfigParser()
+    config.read(filename, encoding='UTF-8')
+    return {
+        # RECLIST部分
+        'input_path': config['RECLIST']['input_path'],
+        'reclist_output_path': config['RECLIST']['reclist_output_path'],
+        'length': int(config['RECLIST']['length']),
+        'include_CV_head': config['RECLIST']['include_CV_head'] == 'True',
+        'include_VV': config['RECLIST']['include_VV'] == 'True',
+        'use_underbar': config['RECLIST']['use_underbar'] == 'True',
+        'use_planb': config['RECLIST']['use_planb'] == 'True',
+        'planner': config['RECLIST'].get('planner', 'greedy'),
+        'seed': int(config['RECLIST'].get('seed', '0')),
+        # OTOSET部分
+        'oto_output_path': config['OTOSET']['oto_output_path'],
+        'oto_max_of_same_cv': int(config['OTOSET']['oto_max_of_same_cv']),
+        'oto_max_of_same_vc': int(config['OTOSET']['oto_max_of_same_vc']),
+        'oto_preset_blank': int(config['OTOSET']['oto_preset_blank']),
+        'oto_bpm': int(config['OTOSET']['oto_bpm']),
+        'oto_divide_vccv': config['OTOSET']['oto_devide_vccv'] == 'True',
+        'oto_repeat_output_path': config['OTOSET'].get('oto_repeat_output_path', ''),
+        'stats_output_path': config['OTOSET'].get('stats_output_path', ''),
+        'db_output_path': config['OTOSET'].get('db_output_path', ''),
+        'oto_timing': read_oto_timing(config),
+    }
+
+
+def read_oto_timing(config):
+    # 读取配置文件中的[OTOTIMING]部分（可选），返回otowriter的timing
+    # 分类名 = 辅音列表；分类名.cv / 分类名.vc / default.vr = 偏移,固定范围,右空白,先行发声（单位为拍）
+    timing = {}
+    if not config.has_section('OTOTIMING'):
+        return timing
+    for key in config['OTOTIMING']:
+        value = config['OTOTIMING'][key]
+        if key.find('.') != -1:
+            _class, kind = key.rsplit('.', 1)
+            timing.setdefault(_class, {})[kind] = tuple(float(x) for x in value.split(','))
+        else:
+            timing.setdefault(key, {})['consonants'] = [x.strip() for x in value.split(',') if x.strip() != '']
+    return timing
+
+
+def result_cache_key(input_path, settings):
+    # 生成结果缓存的键：presamp内容与所有影响输出的设置的SHA-256
+    material = json.dumps([version, parser_version, presamp_digest(input_path), settings], sort_keys=True)
+    return hashlib.sha256(material.encode('UTF-8')).hexdigest()
+
+
+def load_cached_result(key, path, otopath, repeatpath=''):
+    # 缓存中有该结果时，将录音表和oto复制到输出路径并返回result，否则返回None
+    entry = os.path.join(cache_dir, 'result', key)
+    try:
+        with open(os.path.join(entry, 'result.json'), 'r', encoding='UTF-8') as f:
+            cached = json.load(f)
+        gen_result = result()
+        gen_result.rows = cached['rows']
+        gen_result.fillers = cached['fillers']
+        gen_result.oto_count = cached['oto_count']
+        gen_result.repeat = cached['repeat']
+        gen_result.counters = cached['counters']
+        gen_result.coverage = cached.get('coverage', {})
+    except OSError:
+        return None
+    except (ValueError, KeyError, TypeError, AttributeError):
+        # result.json损坏或缺少键时按未命中处理，并删除该条目以便重新写入
+        shutil.rmtree(entry, ignore_errors=True)
+        return None
+    paths = [path, otopath]
+    sources = [os.path.join(entry, 'Reclist.txt'), os.path.join(entry, 'oto.ini')]
+    try:
+        for k in range(0, len(paths)):
+            shutil.copyfile(sources[k], paths[k] + '.part')
+    except OSError:
+        for _path in paths:
+            if os.path.exists(_path + '.part'):
+                os.remove(_path + '.part')
+        return None
+    if repeatpath != '':
+        with open(repeatpath + '.part', 'w', encoding='UTF-8') as f_repeat:
+            for _name in gen_result.repeat:
+                f_repeat.write(_name + ',' + str(gen_result.repeat[_name]) + '\n')
+        paths.append(repeatpath)
+    for _path in paths:
+        os.replace(_path + '.part', _path)
+    os.utime(entry)  # 记录最近使用时间
+    return gen_result
+
+
+def store_cached_result(key, gen_result, path, otopath):
+    # 将生成结果加入缓存，先写入临时目录再改名，无法写入时不影响生成
+    directory = os.path.join(cache_dir, 'result')
+    entry = os.path.join(directory, key)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        temp_entry = tempfile.mkdtemp(suffix='.part', dir=directory)
+        try:
+            shutil.copyfile(path, os.path.join(temp_entry, 'Reclist.txt'))
+            shutil.copyfile(otopath, os.path.join(temp_entry, 'oto.ini'))
+            with open(os.path.join(temp_entry, 'result.json'), 'w', encoding='UTF-8') as f:
+                json.dump({'rows': gen_result.rows, 'fillers': gen_result.fillers, 'oto_count': gen_result.oto_count,
+                           'repeat': gen_result.repeat, 'counters': gen_result.counters, 'coverage': gen_result.coverage}, f, ensure_ascii=False)
+            os.replace(temp_entry, entry)
+        finally:
+            if os.path.exists(temp_entry):
+                shutil.rmtree(temp_entry)
+        cache_evict(directory, result_cache_max_bytes, result_cache_max_entries)
+    except OSError:
+        pass
+
+
+def generate(input_path='presamp.ini', reclist_output_path='Reclist.txt', length=8, include_CV_head=True, include_VV=True, use_underbar=True, use_planb=False, planner='greedy',
+             oto_output_path='oto.ini', oto_max_of_same_cv=3, oto_max_of_same_vc=3, oto_preset_blank=1250, oto_bpm=130, oto_divide_vccv=True, oto_repeat_output_path='', oto_timing=None,
+             stats_output_path='', progress=None, cancel=None, inventory=None, use_cache=True, incremental=False, previous_input_path='', profile=False, seed=0, db_output_path='', oto_only=False, strict_split=False):
+    # 读取presamp并生成录音表和oto，返回result
+    # seed不为0时按该种子打乱音素的顺序后再排列（见worker.shuffled()）
+    # inventory为已经读取过presamp的worker时，不再重复读取
+    # incremental为True时，在已有的录音表和oto上增量生成；给出previous_input_path时记录新旧presamp的差异
+    # profile为True时用cProfile和tracemalloc记录耗时最长的函数及各阶段的内存峰值；给出stats_output_path时将统计写入该JSON文件
+    # 给出db_output_path时将排列和oto条目写入SQLite数据库（此时不使用生成结果缓存）
+    # oto_only为True时不重新排列，只按已有的录音表重新生成oto（见worker.oto_CVVC()），strict_split为True时录音表中有多种切分方式的部分报错
+    timing = {}
+    memory = {}
+    if profile:
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        profiler.enable()
+    time_start = time.perf_counter()
+    try:
+        gen_result = None
+        cache_key = None
+        if use_cache and db_output_path == '' and not oto_only and not (incremental and os.path.exists(reclist_output_path)):
+            # 相同的presamp内容和设置生成过时，直接复制缓存的结果
+            with measure(timing, memory, 'result_cache'):
+                cache_key = result_cache_key(input_path, [length, use_planb, include_CV_head, include_VV, use_underbar, oto_max_of_same_cv, oto_max_of_same_vc,
+                                                          oto_preset_blank, oto_bpm, oto_divide_vccv, planner, oto_timing, seed])
+                gen_result = load_cached_result(cache_key, reclist_output_path, oto_output_path, oto_repeat_output_path)
+        if gen_result != None:
+            gen_result.counters['result_cache_hit'] = 1
+        else:
+            with measure(timing, memory, 'read_presamp'):
+                if inventory != None:
+                    my_worker = inventory
+                    cache_hit = False
+                else:
+                    if progress != None:
+                        progress('read_presamp', 0, 0)
+                    my_worker = worker()
+                    cache_hit = my_worker.load_presamp(input_path, use_cache)
+            with measure(timing, memory, 'gen_CVVC'):
+                if oto_only:
+                    gen_result = my_worker.oto_CVVC(reclist_output_path, use_planb, include_CV_head, include_VV, use_underbar, oto_output_path, oto_max_of_same_cv, oto_max_of_same_vc,
+                                                    oto_preset_blank, oto_bpm, oto_divide_vccv, oto_repeat_output_path, progress, cancel, oto_timing, db_output_path,
+                                                    strict_split)
+                elif incremental and os.path.exists(reclist_output_path):
+                    gen_result = my_worker.shuffled(seed).update_CVVC(reclist_output_path, length, use_planb, include_CV_head, include_VV,
+                                                       use_underbar, oto_output_path, oto_max_of_same_cv, oto_max_of_same_vc, oto_preset_blank, oto_bpm, oto_divide_vccv, oto_repeat_output_path,
+                                                       progress, cancel, planner, oto_timing, db_output_path)
+                    if previous_input_path != '':
+                        old_worker = worker()
+                        old_worker.load_presamp(previous_input_path, use_cache)
+                        gen_result.diff = my_worker.diff_inventory(old_worker)
+                else:
+                    gen_result = my_worker.shuffled(seed).gen_CVVC(reclist_output_path, length, use_planb, include_CV_head, include_VV,
+                                                    use_underbar, oto_output_path, oto_max_of_same_cv, oto_max_of_same_vc, oto_preset_blank, oto_bpm, oto_divide_vccv, oto_repeat_output_path,
+                                                    progress, cancel, planner, oto_timing, db_output_path)
+            if cache_key != None:
+                store_cached_result(cache_key, gen_result, reclist_output_path, oto_output_path)
+                gen_result.counters['result_cache_hit'] = 0
+            if inventory == None:
+                # 本次读取了presamp时，记录读取的各阶段（使用缓存时没有）
+                timing.update(my_worker.timing)
+                memory.update(my_worker.memory)
+                gen_result.counters['presamp_cache_hit'] = int(cache_hit)
+            timing['write'] = timing['gen_CVVC'] - gen_result.timing.get('plan', 0.0)
+    finally:
+        if profile:
+            profiler.disable()
+            if started_tracing:
+                tracemalloc.stop()
+    timing['total'] = time.perf_counter() - time_start
+    gen_result.seed = seed
+    gen_result.timing.update(timing)
+    gen_result.memory.update(memory)
+    if profile:
+        profile_stats = pstats.Stats(profiler).sort_stats('cumulative')
+        for func in profile_stats.fcn_list[:profile_top]:
+            cc, nc, tt, ct, callers = profile_stats.stats[func]
+            gen_result.profile.append({'function': '{}:{}({})'.format(os.path.basename(func[0]), func[1], func[2]), 'calls': nc, 'tottime': tt, 'cumtime': ct})
+        if stats_output_path != '':
+            profiler.dump_stats(os.path.splitext(stats_output_path)[0] + '.prof')
+    if stats_output_path != '':
+        gen_result.write_stats(stats_output_path)
+    return gen_result
+
+
+# 预览：不写入文件，只统计排列结果，按(presamp内容, 设置)缓存
+preview_cache_size = 64  # 缓存的预览结果数
+preview_inventory_cache_size = 4  # 缓存的presamp数
+_preview_results = collections.OrderedDict()
+_preview_inventories = collections.OrderedDict()  # presamp摘要 -> worker
+
+
+def preview(input_path='presamp.ini', length=8, include_CV_head=True, include_VV=True, use_planb=False, planner='greedy',
+            oto_max_of_same_cv=3, oto_max_of_same_vc=3, oto_preset_blank=1250, oto_bpm=130, oto_timing=None, use_cache=True, seed=0):
+    # 返回生成结果的统计（行数、增字数、录音时长、oto条目数），相同的presamp内容和设置直接返回缓存的结果
+    digest = presamp_digest(input_path)
+    key = (digest, length, include_CV_head, include_VV, use_planb, planner, oto_max_of_same_cv, oto_max_of_same_vc,
+           oto_preset_blank, oto_bpm, json.dumps(oto_timing, sort_keys=True), seed)
+    if key in _preview_results:
+        _preview_results.move_to_end(key)
+        return _preview_results[key]
+    my_worker = _preview_inventories.get(digest)
+    if my_worker == None:
+        my_worker = worker()
+        my_worker.load_presamp(input_path, use_cache)
+        _preview_inventories[digest] = my_worker
+        while len(_preview_inventories) > preview_inventory_cache_size:
+            _preview_inventories.popitem(last=False)
+    my_worker = my_worker.shuffled(seed)
+    gen_result = result()
+    oto = otowriter(my_worker.symbols, use_planb, oto_max_of_same_cv, oto_max_of_same_vc, float(oto_preset_blank), float(oto_bpm), oto_timing)
+    oto_count = {'cv': 0, 'vc': 0}
+    recording_ms = 0.0
+    for row in my_worker.plan_CVVC(length, use_planb, include_CV_head, include_VV, gen_result, None, planner):
+        gen_result.rows += 1
+        for kind, entry in oto.entries(my_worker.render_row(row), row):
+            oto_count[kind] += 1
+        # 每行为前置空白、各字各一拍以及句尾的一拍
+        recording_ms += oto.preset_blank + (len(row) + 1) * oto.ticks
+    preview_stats = {
+        'rows': gen_result.rows,
+        'fillers': gen_result.fillers,
+        'recording_seconds': recording_ms / 1000,
+        'oto_cv': oto_count['cv'],
+        'oto_vc': oto_count['vc'],
+        'aliases': len(oto.exist_count_cv) + len(oto.exist_count_vc),
+        'oto_dropped': oto.dropped_cv + oto.dropped_vc,
+    }
+    _preview_results[key] = preview_stats
+    while len(_preview_results) > preview_cache_size:
+        _preview_results.popitem(last=False)
+    return preview_stats
+
+
+def compare_planners(my_worker, length=8, UsePlanB=False, CV_head=True, IncludeVV=True):
+    # 分别用各个补全VC部的算法排列（不写入文件），返回各算法的统计
+    all_stats = []
+    for planner in planners:
+        gen_result = result()
+        time_start = time.perf_counter()
+        for row in my_worker.plan_CVVC(length, UsePlanB, CV_head, IncludeVV, gen_result, None, planner):
+            gen_result.rows += 1
+        all_stats.append({'planner': planner, 'rows': gen_result.rows, 'fillers': gen_result.fillers,
+                          'rows_vc': gen_result.counters['rows_vc'], 'time': time.perf_counter() - time_start})
+    return all_stats
+
+
+def format_planner_comparison(all_stats):
+    # 生成各算法的比较表
+    lines = ['{:<8}  {:>6}  {:>7}  {:>7}  {:>8}'.format('planner', 'rows', 'fillers', 'rows_vc', 'time(s)')]
+    for planner_stats in all_stats:
+        lines.append('{:<8}  {:>6}  {:>7}  {:>7}  {:>8.3f}'.format(planner_stats['planner'], planner_stats['rows'], planner_stats['fillers'],
+                                                                planner_stats['rows_vc'], planner_stats['time']))
+    return '\n'.join(lines)
+
+
+# 批量生成
+# 每个进程中已经读取过的presamp（路径 -> worker），同一进程内每个presamp只读取一次
+_batch_inventories = {}
+
+
+def manifest_value(key, value, default):
+    # 将清单中的一项设置转换为与read_config()的结果相同的类型（default为该项在read_config()中的值），类型不符时报错
+    # 与配置文件一致，真假值和整数也可以写成字符串（"True"、"8"）
+    if isinstance(default, bool):
+        if isinstance(value, bool):
+            return value
+        if value in ('True', 'False'):
+            return value == 'True'
+        raise ValueError('{} must be true or false: {!r}'.format(key, value))
+    if isinstance(default, int):
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+        if isinstance(value, str):
+            try:
+                return int(value)
+            except ValueError:
+                pass
+        raise ValueError('{} must be an integer: {!r}'.format(key, value))
+    if isinstance(default, dict):
+        if isinstance(value, dict):
+            return value
+        raise ValueError('{} must be an object: {!r}'.format(key, value))
+    if not isinstance(value, str):
+        raise ValueError('{} must be a string: {!r}'.format(key, value))
+    if key == 'planner' and value not in planners:
+        raise ValueError('unknown planner: ' + value)
+    return value
+
+
+def read_manifest(filename, base_settings):
+    # 读取批量生成的清单（JSON），返回所有任务的generate()参数
+    # 清单中的presamps与settings两两组合成任务，其余键作为所有任务的公共设置
+    # 输出路径可以使用{job}、{presamp_dir}、{presamp_name}以及任意设置项（如{length}）作为模板
+    with open(filename, 'r', encoding='UTF-8') as f:
+        manifest = json.load(f)
+    common = dict(base_settings)
+    for key in manifest:
+        if key not in ('presamps', 'settings'):
+            common[key] = manifest[key]
+    for overrides in [common] + manifest.get('settings', []):
+        for key in overrides:
+            if key not in base_settings:
+                raise ValueError('unknown setting in manifest: ' + key)
+    jobs = []
+    for presamp, overrides in itertools.product(manifest['presamps'], manifest.get('settings', [{}])):
+        job = dict(common)
+        job.update(overrides)
+        job['input_path'] = presamp
+        for key in job:
+            try:
+                job[key] = manifest_value(key, job[key], base_settings[key])
+            except ValueError as e:
+                raise ValueError('manifest job {} ({}): {}'.format(len(jobs), presamp, e))
+        fields = dict(job)
+        fields['job'] = len(jobs)
+        fields['presamp_dir'] = os.path.basename(os.path.dirname(os.path.abspath(presamp)))
+        fields['presamp_name'] = os.path.splitext(os.path.basename(presamp))[0]
+        for key in ('reclist_output_path', 'oto_output_path', 'oto_repeat_output_path', 'stats_output_path', 'db_output_path'):
+            job[key] = job[key].format(**fields)
+        jobs.append(job)
+    return jobs
+
+
+def run_batch_job(job, use_cache=True):
+    # 在工作进程中运行一个批量任务，返回该任务的统计
+    time_start = time.perf_counter()
+    job_stats = {'input_path': job['input_path'], 'reclist_output_path': job['reclist_output_path']}
+    try:
+        if job['input_path'] not in _batch_inventories:
+            inventory = worker()
+            inventory.load_presamp(job['input_path'], use_cache)
+            _batch_inventories[job['input_path']] = inventory
+        for key in ('reclist_output_path', 'oto_output_path', 'oto_repeat_output_path', 'stats_output_path', 'db_output_path'):
+            if os.path.dirname(job[key]) != '':
+                os.makedirs(os.path.dirname(job[key]), exist_ok=True)
+        gen_result = generate(inventory=_batch_inventories[job['input_path']], use_cache=use_cache, **job)
+        job_stats['rows'] = gen_result.rows
+        job_stats['fillers'] = gen_result.fillers
+        job_stats['oto_count'] = gen_result.oto_count
+    except Exception as e:
+        # 任何错误都只记录在该任务的统计中，不中止其他任务
+        job_stats['error'] = repr(e)
+    job_stats['time'] = time.perf_counter() - time_start
+    return job_stats
+
+
+def run_batch(jobs, max_workers=None, use_cache=True):
+    # 使用进程池并行运行所有任务，按任务顺序返回统计
+    # 同一presamp的任务排在一起分块提交，使其尽量在同一进程中只读取一次
+    order = sorted(range(0, len(jobs)), key=lambda k: jobs[k]['input_path'])
+    if max_workers == None:
+        max_workers = os.cpu_count() or 1
+    import concurrent.futures
+    chunksize = max(1, len(jobs) // (max_workers * 4))
+    all_stats = [None] * len(jobs)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for k, job_stats in zip(order, executor.map(run_batch_job, [jobs[k] for k in order], itertools.repeat(use_cache), chunksize=chunksize)):
+            job_stats['job'] = k
+            all_stats[k] = job_stats
+    return all_stats
+
+
+def format_batch_summary(all_stats):
+    # 生成批量任务的汇总表
+    lines = ['{:>4}  {:<40}  {:>6}  {:>7}  {:>6}  {:>8}'.format('job', 'reclist', 'rows', 'fillers', 'oto', 'time(s)')]
+    for job_stats in all_stats:
+        if 'error' in job_stats:
+            lines.append('{:>4}  {:<40}  ERROR {}'.format(job_stats['job'], job_stats['reclist_output_path'], job_stats['error']))
+        else:
+            lines.append('{:>4}  {:<40}  {:>6}  {:>7}  {:>6}  {:>8.2f}'.format(job_stats['job'], job_stats['reclist_output_path'], job_stats['rows'],
+                                                                          job_stats['fillers'], job_stats['oto_count'], job_stats['time']))
+    return '\n'.join(lines)
+
+
+# 自动搜索：在多个进程中对一组候选设置分别预览（不写入文件），按行数等排序后只生成最好的一组
+auto_grid_keys = ('length', 'use_planb', 'include_CV_head', 'include_VV', 'planner')  # 可以搜索的设置
+auto_rank_keys = ('rows', 'fillers', 'recording_seconds')  # 排序依据，第一项相同时依次比较其余各项
+auto_preview_keys = ('input_path', 'length', 'include_CV_head', 'include_VV', 'use_planb', 'planner', 'oto_max_of_same_cv', 'oto_max_of_same_vc',
+                     'oto_preset_blank', 'oto_bpm', 'oto_timing', 'seed')  # 传给preview()的设置
+candidate_errors = (OSError, KeyError, ValueError, IndexError)  # 预览一组设置失败时记录在该组的统计中，不中止其他候选
+
+
+def auto_grid(config, overrides=None):
+    # 返回各设置的候选值：默认搜索每行4~12字、Plan A与Plan B以及所有补全算法，是否要求句首CV和VV与config相同
+    # overrides为设置 -> 候选值列表，覆盖默认的候选值
+    grid = {
+        'length': list(range(4, 13)),
+        'use_planb': [False, True],
+        'include_CV_head': [config['include_CV_head']],
+        'include_VV': [config['include_VV']],
+        'planner': list(planners),
+    }
+    if overrides != None:
+        grid.update(overrides)
+    return grid
+
+
+def parse_auto_grid(text):
+    # “设置=值1,值2,...”，如“length=6,8,10”或“use_planb=True,False”
+    key, values = text.split('=', 1)
+    if key not in auto_grid_keys:
+        raise ValueError('unknown setting for auto search: ' + key)
+    values = [x.strip() for x in values.split(',') if x.strip() != '']
+    if key == 'length':
+        return key, [int(x) for x in values]
+    if key == 'planner':
+        for x in values:
+            if x not in planners:
+                raise ValueError('unknown planner: ' + x)
+        return key, values
+    for x in values:
+        if x not in ('True', 'False'):
+            raise ValueError('{} must be True or False: {}'.format(key, x))
+    return key, [x == 'True' for x in values]
+
+
+def run_candidate(settings, label, use_cache=True):
+    # 在工作进程中预览一组设置，返回以label开头的统计；同一进程中的presamp只读取一次（由preview()缓存）
+    candidate_stats = dict(label)
+    try:
+        candidate_stats.update(preview(**settings, use_cache=use_cache))
+    except candidate_errors as e:
+        candidate_stats['error'] = repr(e)
+    return candidate_stats
+
+
+def candidate_pool(input_path, max_workers, use_cache=True):
+    # 返回预览候选用的进程池
+    # 先在当前进程读取一次presamp，使工作进程可以直接使用presamp缓存；读取失败时由各候选分别报告错误
+    import concurrent.futures
+    if use_cache:
+        try:
+            worker().load_presamp(input_path, use_cache)
+        except candidate_errors:
+            pass
+    return concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+
+
+def auto_search(config, grid, max_workers=None, use_cache=True, rank='rows'):
+    # 预览grid中的所有组合，返回按rank（相同时按auto_rank_keys中的其余各项）从好到坏排序的统计
+    # max_workers为1时在当前进程中依次预览
+    base = {key: config[key] for key in auto_preview_keys}
+    candidates = []
+    labels = []
+    for values in itertools.product(*[grid[key] for key in auto_grid_keys]):
+        settings = dict(base)
+        settings.update(zip(auto_grid_keys, values))
+        candidates.append(settings)
+        labels.append({'settings': dict(zip(auto_grid_keys, values))})
+    if max_workers == None:
+        max_workers = os.cpu_count() or 1
+    if max_workers == 1 or len(candidates) == 1:
+        all_stats = [run_candidate(candidates[k], labels[k], use_cache) for k in range(0, len(candidates))]
+    else:
+        with candidate_pool(config['input_path'], min(max_workers, len(candidates)), use_cache) as executor:
+            all_stats = list(executor.map(run_candidate, candidates, labels, itertools.repeat(use_cache)))
+    order = (rank,) + tuple(key for key in auto_rank_keys if key != rank)
+    ranked = [candidate_stats for candidate_stats in all_stats if 'error' not in candidate_stats]
+    ranked.sort(key=lambda candidate_stats: tuple(candidate_stats[key] for key in order))
+    return ranked + [candidate_stats for candidate_stats in all_stats if 'error' in candidate_stats]
+
+
+def format_auto_ranking(ranked):
+    # 生成自动搜索结果的排名表（录音时长为分:秒）
+    lines = ['{:>4}  {:>6}  {:<6}  {:<7}  {:<5}  {:<8}  {:>6}  {:>7}  {:>9}  {:>6}'.format(
+        'rank', 'length', 'plan', 'cv_head', 'vv', 'planner', 'rows', 'fillers', 'recording', 'oto')]
+    for k in range(0, len(ranked)):
+        candidate_settings = ranked[k]['settings']
+        prefix = '{:>4}  {:>6}  {:<6}  {:<7}  {:<5}  {:<8}  '.format(k + 1, candidate_settings['length'], 'B' if candidate_settings['use_planb'] else 'A',
+                                                                    str(candidate_settings['include_CV_head']), str(candidate_settings['include_VV']),
+                                                                    candidate_settings['planner'])
+        if 'error' in ranked[k]:
+            lines.append(prefix + 'ERROR ' + ranked[k]['error'])
+            continue
+        minutes, seconds = divmod(int(round(ranked[k]['recording_seconds'])), 60)
+        lines.append(prefix + '{:>6}  {:>7}  {:>9}  {:>6}'.format(ranked[k]['rows'], ranked[k]['fillers'], '{}:{:02d}'.format(minutes, seconds),
+                                                                  ranked[k]['oto_cv'] + ranked[k]['oto_vc']))
+    return '\n'.join(lines)
+
+
+# 多起点优化：在多个进程中用不同的种子打乱音素顺序后分别预览，保留行数和增字数最少的种子
+def optimize_order(config, starts=64, time_budget=30.0, max_workers=None, use_cache=True):
+    # 依次尝试种子0 ~ starts-1（种子0为原始顺序），超过time_budget秒后不再开始新的尝试（至少尝试一次）
+    # 返回按(行数, 增字数, 录音时长, 种子)从好到坏排序的统计
+    settings = {key: config[key] for key in auto_preview_keys if key != 'seed'}
+    deadline = time.perf_counter() + time_budget
+    all_stats = []
+    if max_workers == None:
+        max_workers = os.cpu_count() or 1
+    if max_workers == 1:
+        for seed in range(0, starts):
+            if seed > 0 and time.perf_counter() >= deadline:
+                break
+            all_stats.append(run_candidate(dict(settings, seed=seed), {'seed': seed}, use_cache))
+    else:
+        import concurrent.futures
+        with candidate_pool(config['input_path'], max_workers, use_cache) as executor:
+            # 同时最多提交max_workers个尝试，到达时限后只等待已经开始的尝试
+            pending = set()
+            seed = 0
+            while True:
+                while seed < starts and len(pending) < max_workers and (seed == 0 or time.perf_counter() < deadline):
+                    pending.add(executor.submit(run_candidate, dict(settings, seed=seed), {'seed': seed}, use_cache))
+                    seed += 1
+                if len(pending) == 0:
+                    break
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    all_stats.append(future.result())
+    ranked = [candidate_stats for candidate_stats in all_stats if 'error' not in candidate_stats]
+    ranked.sort(key=lambda candidate_stats: (candidate_stats['rows'], candidate_stats['fillers'], candidate_stats['recording_seconds'], candidate_stats['seed']))
+    return ranked + sorted([candidate_stats for candidate_stats in all_stats if 'error' in candidate_stats], key=lambda candidate_stats: candidate_stats['seed'])
+
+
+def format_order_ranking(ranked, top=10):
+    # 生成多起点优化结果的排名表（只列出前top名，并与原始顺序比较）
+    lines = ['{:>4}  {:>6}  {:>6}  {:>7}  {:>9}  {:>6}'.format('rank', 'seed', 'rows', 'fillers', 'recording', 'oto')]
+    for k in range(0, len(ranked)):
+        if k >= top and ranked[k]['seed'] != 0:
+            continue
+        if 'error' in ranked[k]:
+            lines.append('{:>4}  {:>6}  ERROR {}'.format(k + 1, ranked[k]['seed'], ranked[k]['error']))
+            continue
+        minutes, seconds = divmod(int(round(ranked[k]['recording_seconds'])), 60)
+        lines.append('{:>4}  {:>6}  {:>6}  {:>7}  {:>9}  {:>6}'.format(k + 1, ranked[k]['seed'], ranked[k]['rows'], ranked[k]['fillers'],
+                                                                      '{}:{:02d}'.format(minutes, seconds), ranked[k]['oto_cv'] + ranked[k]['oto_vc']))
+    lines.append('{} orderings tried'.format(len(ranked)))
+    return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='ReclistGen_CVVC ver' + version)
+    parser.add_argument('--config', default='reclist-gen-cvvc.ini', help='配置文件路径')
+    parser.add_argument('--batch', metavar='MANIFEST', help='批量生成的清单文件（JSON）')
+    parser.add_argument('--jobs', type=int, default=None, help='批量生成时的进程数（默认为CPU核数）')
+    parser.add_argument('--no-cache', action='store_true', help='不使用presamp缓存和生成结果缓存')
+    parser.add_argument('--cache-dir', default=cache_dir, help='缓存目录')
+    parser.add_argument('--incremental', action='store_true', help='保留已有的录音表和oto，只追加新增音素所需的行')
+    parser.add_argument('--oto-only', action='store_true', help='不重新排列，按已有的录音表和当前的oto设置重新生成oto')
+    parser.add_argument('--strict-split', action='store_true', help='只生成oto时，不使用下划线的录音表中有多种切分方式的部分报错（默认按最长匹配切分并给出警告）')
+    parser.add_argument('--previous-presamp', default='', help='增量生成时用于比较的旧presamp文件')
+    parser.add_argument('--stats', default=None, metavar='PATH', help='统计的输出路径（JSON，覆盖配置文件中的stats_output_path）')
+    parser.add_argument('--db', default=None, metavar='PATH', help='将排列和oto条目写入SQLite数据库（覆盖配置文件中的db_output_path）')
+    parser.add_argument('--profile', action='store_true', help='用cProfile和tracemalloc记录耗时与内存（较慢）')
+    parser.add_argument('--planner', choices=planners, default=None, help='补全VC部的算法（覆盖配置文件中的planner）')
+    parser.add_argument('--compare-planners', action='store_true', help='不生成文件，比较各算法的行数和增字数')
+    parser.add_argument('--auto', action='store_true', help='并行预览多组设置，输出排名并只用最好的一组生成')
+    parser.add_argument('--auto-grid', action='append', default=[], metavar='KEY=V1,V2', help='自动搜索时某项设置的候选值（可多次指定），如length=6,8,10')
+    parser.add_argument('--auto-rank', choices=auto_rank_keys, default='rows', help='自动搜索时排序的首要依据（默认为行数）')
+    parser.add_argument('--dry-run', action='store_true', help='自动搜索或多起点优化时只输出排名，不生成文件')
+    parser.add_argument('--verify', nargs='?', const='', default=None, metavar='RECLIST', help='不生成文件，检查录音表（默认为配置文件中的输出路径）是否覆盖所有音素')
+    parser.add_argument('--seed', type=int, default=None, help='打乱音素顺序的随机种子（覆盖配置文件中的seed，0为原始顺序）')
+    parser.add_argument('--optimize-order', action='store_true', help='并行尝试多个随机种子，用行数和增字数最少的种子生成')
+    parser.add_argument('--starts', type=int, default=64, help='多起点优化时最多尝试的种子数')
+    parser.add_argument('--time-budget', type=float, default=30.0, help='多起点优化的时限（秒），超过后不再开始新的尝试')
+    args = parser.parse_args()
+    cache_dir = os.environ['RECLIST_GEN_CVVC_CACHE'] = args.cache_dir
+    config = read_config(args.config)
+    if args.stats != None:
+        config['stats_output_path'] = args.stats
+    if args.db != None:
+        config['db_output_path'] = args.db
+    if args.planner != None:
+        config['planner'] = args.planner
+    if args.seed != None:
+        config['seed'] = args.seed
+    if args.verify != None:
+        report = verify(config['input_path'], args.verify or config['reclist_output_path'], config['use_planb'], config['include_CV_head'], config['include_VV'],
+                        not args.no_cache, config['use_underbar'])
+        print(format_coverage(report))
+        if not report['complete']:
+            sys.exit(1)
+    elif args.compare_planners:
+        my_worker = worker()
+        my_worker.load_presamp(config['input_path'], not args.no_cache)
+        print(format_planner_comparison(compare_planners(my_worker, config['length'], config['use_planb'], config['include_CV_head'], config['include_VV'])))
+    elif args.auto:
+        ranked = auto_search(config, auto_grid(config, dict(parse_auto_grid(text) for text in args.auto_grid)), args.jobs, not args.no_cache, args.auto_rank)
+        print(format_auto_ranking(ranked))
+        if len(ranked) > 0 and 'error' not in ranked[0] and not args.dry_run:
+            config.update(ranked[0]['settings'])
+            generate(**config, use_cache=not args.no_cache, profile=args.profile)
+            print('generated with ' + ', '.join('{}={}'.format(key, config[key]) for key in auto_grid_keys))
+    elif args.optimize_order:
+        ranked = optimize_order(config, args.starts, args.time_budget, args.jobs, not args.no_cache)
+        print(format_order_ranking(ranked))
+        if len(ranked) > 0 and 'error' not in ranked[0] and not args.dry_run:
+            config['seed'] = ranked[0]['seed']
+            generate(**config, use_cache=not args.no_cache, profile=args.profile)
+            print('generated with seed={} (use --seed {} or seed = {} in [RECLIST] to reproduce)'.format(config['seed'], config['seed'], config['seed']))
+    elif args.batch:
+        batch_stats = run_batch(read_manifest(args.batch, config), args.jobs, not args.no_cache)
+        print(format_batch_summary(batch_stats))
+    elif args.oto_only:
+        gen_result = generate(**config, use_cache=not args.no_cache, oto_only=True, profile=args.profile, strict_split=args.strict_split)
+        for line, chunk, found in gen_result.coverage.get('unsplit', []):
+            print('warning: {}:{}: {} can be split in more than one way, read as {} (also {})'.format(config['reclist_output_path'], line, chunk, found[0], ' / '.join(found[1:])), file=sys.stderr)
+        print('{} rows, {} oto entries'.format(gen_result.rows, gen_result.oto_count))
+        if not gen_result.coverage.get('complete', True):
+            print(format_coverage(gen_result.coverage))
+    elif args.incremental:
+        gen_result = generate(**config, use_cache=not args.no_cache, incremental=True, previous_input_path=args.previous_presamp, profile=args.profile)
+        for kind in gen_result.diff:
+            added, removed = gen_result.diff[kind]
+            print('{}: +{} -{}'.format(kind, len(added), len(removed)))
+            for _unit in added:
+                print('  + ' + _unit)
+            for _unit in removed:
+                print('  - ' + _unit)
+        print('{} rows kept, {} rows added'.format(gen_result.rows - gen_result.added_rows, gen_result.added_rows))
+    else:
+        gen_result = generate(**config, use_cache=not args.no_cache, profile=args.profile)
+        if not gen_result.coverage.get('complete', True):
+            print(format_coverage(gen_result.coverage))
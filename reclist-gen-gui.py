@@ -1,12 +1,28 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, Menu
 import configparser
-import subprocess
 import sys
 import os
-import webbrowser
+import importlib.util
+import threading
+import queue
+import time
 
 import json
+# subprocess、webbrowser只在打开README和开源地址时使用，在用到时才导入，以缩短启动时间
+
+
+def load_generator():
+    # 在进程内载入生成脚本（文件名含连字符，无法直接import）
+    script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reclist-gen-cvvc.py")
+    spec = importlib.util.spec_from_file_location("reclist_gen_cvvc", script_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+generator = load_generator()
 
 # 语言管理类
 class LanguageManager:
@@ -18,16 +34,8 @@ class LanguageManager:
         }
         self.translations = {}
         self.lang_dir = "lang"
-        # 确保语言目录存在
-        if not os.path.exists(self.lang_dir):
-            os.makedirs(self.lang_dir)
-        # 加载所有语言的翻译
-        self.load_all_translations()
-    
-    def load_all_translations(self):
-        # 加载所有语言的翻译文件
-        for lang_code in self.languages.keys():
-            self.load_translation(lang_code)
+        # 只加载当前语言的翻译，其他语言在第一次切换时再加载
+        self.load_translation(self.current_language)
     
     def load_translation(self, lang_code):
         # 从JSON文件加载翻译
@@ -59,6 +67,7 @@ class LanguageManager:
             "include_vv": "生成所有VV连接" if lang_code == "zh" else "Include all VV connections",
             "use_underbar": "使用下划线" if lang_code == "zh" else "Use underbar",
             "planb": "PlanB",
+            "planner": "VC补全算法：" if lang_code == "zh" else "VC planner:",
             "oto_settings": "OTO设置" if lang_code == "zh" else "OTO Settings",
             "max_same_cv": "相同CV最大数量：" if lang_code == "zh" else "Max same CV:",
             "max_same_vc": "相同VC最大数量：" if lang_code == "zh" else "Max same VC:",
@@ -66,21 +75,40 @@ class LanguageManager:
             "bpm": "BPM：" if lang_code == "zh" else "BPM:",
             "divide_vccv": "分割VCCV" if lang_code == "zh" else "Divide VCCV",
             "start_generation": "开始生成" if lang_code == "zh" else "Start Generation",
+            "save_settings": "保存设置" if lang_code == "zh" else "Save Settings",
+            "cancel": "取消" if lang_code == "zh" else "Cancel",
+            "ready": "就绪" if lang_code == "zh" else "Ready",
+            "cancelling": "正在取消……" if lang_code == "zh" else "Cancelling...",
+            "progress_status": "{}：{}行，剩余VC {}" if lang_code == "zh" else "{}: {} lines, {} VC remaining",
+            "phase_read_presamp": "读取presamp" if lang_code == "zh" else "Reading presamp",
+            "phase_plan": "生成录音表" if lang_code == "zh" else "Generating reclist",
+            "phase_oto": "写入OTO" if lang_code == "zh" else "Writing OTO",
+            "generation_cancelled": "生成已取消" if lang_code == "zh" else "Generation Cancelled",
+            "cancelled_message": "生成已取消，没有写入任何文件。" if lang_code == "zh" else "Generation was cancelled. No files were written.",
             "exit": "退出" if lang_code == "zh" else "Exit",
             "generation_success": "生成成功" if lang_code == "zh" else "Generation Success",
             "generation_failed": "生成失败" if lang_code == "zh" else "Generation Failed",
             "success_message": "Reclist和OTO文件已成功生成！" if lang_code == "zh" else "Reclist and OTO files have been successfully generated!",
+            "generation_stats": "共{}行，{}条OTO，用时{:.2f}秒" if lang_code == "zh" else "{} lines, {} OTO entries in {:.2f}s",
+            "coverage_incomplete": "覆盖检查：有{}个音素未覆盖，详见生成统计" if lang_code == "zh" else "Coverage check: {} units are not covered, see Generation Statistics",
             "error_message": "生成过程中出现错误：{}" if lang_code == "zh" else "Error during generation: {}",
             "unknown_error": "发生未知错误：{}" if lang_code == "zh" else "Unknown error occurred: {}",
             "menu_language": "语言" if lang_code == "zh" else "Language",
             "menu_help": "帮助" if lang_code == "zh" else "Help",
             "menu_readme": "查看README" if lang_code == "zh" else "View README",
-            "menu_github": "开源地址" if lang_code == "zh" else "GitHub"
+            "menu_github": "开源地址" if lang_code == "zh" else "GitHub",
+            "menu_stats": "生成统计" if lang_code == "zh" else "Generation Statistics",
+            "preview": "预览" if lang_code == "zh" else "Preview",
+            "preview_pending": "正在计算……" if lang_code == "zh" else "Calculating...",
+            "preview_stats": "{}行，{}个增字，录音约{}\nOTO {}条（CV {}，VC {}），别名{}个" if lang_code == "zh" else "{} lines, {} fillers, about {} of recording\n{} OTO entries ({} CV, {} VC), {} aliases",
+            "preview_error": "无法预览：{}" if lang_code == "zh" else "Preview unavailable: {}",
+            "no_stats": "还没有生成过录音表。" if lang_code == "zh" else "No reclist has been generated yet."
         }
         return default_translation
     
     def save_translation(self, lang_code):
         # 保存翻译到JSON文件
+        os.makedirs(self.lang_dir, exist_ok=True)
         file_path = os.path.join(self.lang_dir, f"{lang_code}.json")
         with open(file_path, "w", encoding="utf-8") as f:
             json.dump(self.translations[lang_code], f, ensure_ascii=False, indent=4)
@@ -88,6 +116,8 @@ class LanguageManager:
     def set_language(self, lang):
         if lang in self.languages:
             self.current_language = lang
+            if lang not in self.translations:
+                self.load_translation(lang)
     
     def get(self, key, *args):
         # 确保当前语言的翻译已加载
@@ -112,7 +142,7 @@ class ReclistGeneratorGUI:
         self.lang_manager = LanguageManager()
         
         self.root.title(self.lang_manager.get("title"))
-        self.root.geometry("500x700")
+        self.root.geometry("500x800")
         self.root.resizable(False, False)
         
         # 读取配置文件
@@ -120,6 +150,28 @@ class ReclistGeneratorGUI:
         self.config_file = "reclist-gen-cvvc.ini"
         self.load_config()
         
+        # 后台生成线程及其消息队列
+        self.generation_thread = None
+        self.generation_queue = queue.Queue()
+        self.cancel_event = None
+        # 最近一次生成的统计
+        self.last_stats = None
+        
+        # 预览：设置变化后延迟一段时间再在后台计算，只显示最新一次的结果
+        # 所有预览在同一个后台线程中依次计算，排队期间被新请求取代的请求直接跳过
+        self.preview_after = None
+        self.preview_thread = None
+        self.preview_requests = queue.Queue()
+        self.preview_queue = queue.Queue()
+        self.preview_serial = 0
+        self.preview_polling = False
+        self.preview_message = ("pending",)
+        
+        # 需要翻译的控件及菜单项，切换语言时只更新文字，不重建界面
+        self.translated_widgets = []
+        self.translated_menu_entries = []
+        self.status_message = ("ready",)
+        
         # 创建菜单栏
         self.create_menu()
         
@@ -139,8 +191,21 @@ class ReclistGeneratorGUI:
         # 创建OTO设置框架
         self.create_oto_frame()
         
+        # 创建预览框架
+        self.create_preview_frame()
+        
+        # 创建进度框架
+        self.create_status_frame()
+        
         # 创建按钮框架
         self.create_button_frame()
+        
+        # 设置变化时更新预览
+        self.watch_settings()
+        
+        # 记住读取时的设置，退出时只在有改动时保存
+        self.update_config()
+        self.saved_config = self.config_snapshot()
     
     def load_config(self):
         if os.path.exists(self.config_file):
@@ -154,7 +219,9 @@ class ReclistGeneratorGUI:
                 "include_CV_head": "True",
                 "include_VV": "True",
                 "use_underbar": "True",
-                "use_planb": "False"
+                "use_planb": "False",
+                "planner": "greedy",
+                "seed": "0"
             }
             self.config["OTOSET"] = {
                 "oto_output_path": "oto.ini",
@@ -162,38 +229,46 @@ class ReclistGeneratorGUI:
                 "oto_max_of_same_vc": "1",
                 "oto_preset_blank": "1250",
                 "oto_bpm": "130",
-                "oto_devide_vccv": "True"
+                "oto_devide_vccv": "True",
+                "oto_repeat_output_path": "",
+                "stats_output_path": "",
+                "db_output_path": ""
             }
             self.save_config()
     
     def save_config(self):
         with open(self.config_file, "w", encoding="utf-8") as f:
             self.config.write(f)
+        self.saved_config = self.config_snapshot()
+    
+    def config_snapshot(self):
+        # 配置内容的副本，用于判断设置是否在读取或保存之后改动过
+        return {section: dict(self.config[section]) for section in self.config.sections()}
     
     def create_path_frame(self):
-        frame = ttk.LabelFrame(self.main_frame, text=self.lang_manager.get("path_settings"), padding="15")
+        frame = self.translate(ttk.LabelFrame(self.main_frame, padding="15"), "path_settings")
         frame.pack(fill=tk.X, pady=(0, 15))
         
         # 输入文件路径
-        ttk.Label(frame, text=self.lang_manager.get("input_file_path")).grid(row=0, column=0, sticky=tk.W, pady=5)
+        self.translate(ttk.Label(frame), "input_file_path").grid(row=0, column=0, sticky=tk.W, pady=5)
         self.input_path_var = tk.StringVar(value=self.config["RECLIST"]["input_path"])
         input_path_entry = ttk.Entry(frame, textvariable=self.input_path_var, width=30)
         input_path_entry.grid(row=0, column=1, padx=5, pady=5)
-        ttk.Button(frame, text=self.lang_manager.get("browse"), command=self.browse_input_path).grid(row=0, column=2, padx=5, pady=5)
+        self.translate(ttk.Button(frame, command=self.browse_input_path), "browse").grid(row=0, column=2, padx=5, pady=5)
         
         # Reclist输出路径
-        ttk.Label(frame, text=self.lang_manager.get("reclist_output_path")).grid(row=1, column=0, sticky=tk.W, pady=5)
+        self.translate(ttk.Label(frame), "reclist_output_path").grid(row=1, column=0, sticky=tk.W, pady=5)
         self.reclist_output_var = tk.StringVar(value=self.config["RECLIST"]["reclist_output_path"])
         reclist_output_entry = ttk.Entry(frame, textvariable=self.reclist_output_var, width=30)
         reclist_output_entry.grid(row=1, column=1, padx=5, pady=5)
-        ttk.Button(frame, text=self.lang_manager.get("browse"), command=self.browse_reclist_output_path).grid(row=1, column=2, padx=5, pady=5)
+        self.translate(ttk.Button(frame, command=self.browse_reclist_output_path), "browse").grid(row=1, column=2, padx=5, pady=5)
         
         # OTO输出路径
-        ttk.Label(frame, text=self.lang_manager.get("oto_output_path")).grid(row=2, column=0, sticky=tk.W, pady=5)
+        self.translate(ttk.Label(frame), "oto_output_path").grid(row=2, column=0, sticky=tk.W, pady=5)
         self.oto_output_var = tk.StringVar(value=self.config["OTOSET"]["oto_output_path"])
         oto_output_entry = ttk.Entry(frame, textvariable=self.oto_output_var, width=30)
         oto_output_entry.grid(row=2, column=1, padx=5, pady=5)
-        ttk.Button(frame, text=self.lang_manager.get("browse"), command=self.browse_oto_output_path).grid(row=2, column=2, padx=5, pady=5)
+        self.translate(ttk.Button(frame, command=self.browse_oto_output_path), "browse").grid(row=2, column=2, padx=5, pady=5)
     
     def browse_input_path(self):
         filename = filedialog.askopenfilename(filetypes=[("INI Files", "*.ini"), ("All Files", "*.*")])
@@ -211,77 +286,220 @@ class ReclistGeneratorGUI:
             self.oto_output_var.set(filename)
     
     def create_reclist_frame(self):
-        frame = ttk.LabelFrame(self.main_frame, text=self.lang_manager.get("reclist_settings"), padding="15")
+        frame = self.translate(ttk.LabelFrame(self.main_frame, padding="15"), "reclist_settings")
         frame.pack(fill=tk.X, pady=(0, 15))
         
         # 每行长度
-        ttk.Label(frame, text=self.lang_manager.get("length_per_line")).grid(row=0, column=0, sticky=tk.W, pady=5)
+        self.translate(ttk.Label(frame), "length_per_line").grid(row=0, column=0, sticky=tk.W, pady=5)
         self.length_var = tk.IntVar(value=int(self.config["RECLIST"]["length"]))
         length_spinbox = ttk.Spinbox(frame, from_=1, to=20, textvariable=self.length_var, width=5)
         length_spinbox.grid(row=0, column=1, padx=5, pady=5, sticky=tk.W)
         
         # 生成所有起始音
         self.include_cv_head_var = tk.BooleanVar(value=self.config["RECLIST"]["include_CV_head"] == "True")
-        ttk.Checkbutton(frame, text=self.lang_manager.get("include_cv_head"), variable=self.include_cv_head_var).grid(row=1, column=0, sticky=tk.W, pady=5)
+        self.translate(ttk.Checkbutton(frame, variable=self.include_cv_head_var), "include_cv_head").grid(row=1, column=0, sticky=tk.W, pady=5)
         
         # 生成所有VV连接
         self.include_vv_var = tk.BooleanVar(value=self.config["RECLIST"]["include_VV"] == "True")
-        ttk.Checkbutton(frame, text=self.lang_manager.get("include_vv"), variable=self.include_vv_var).grid(row=1, column=1, sticky=tk.W, pady=5)
+        self.translate(ttk.Checkbutton(frame, variable=self.include_vv_var), "include_vv").grid(row=1, column=1, sticky=tk.W, pady=5)
         
         # 使用下划线
         self.use_underbar_var = tk.BooleanVar(value=self.config["RECLIST"]["use_underbar"] == "True")
-        ttk.Checkbutton(frame, text=self.lang_manager.get("use_underbar"), variable=self.use_underbar_var).grid(row=2, column=0, sticky=tk.W, pady=5)
+        self.translate(ttk.Checkbutton(frame, variable=self.use_underbar_var), "use_underbar").grid(row=2, column=0, sticky=tk.W, pady=5)
         
         # PlanB
         self.use_planb_var = tk.BooleanVar(value=self.config["RECLIST"]["use_planb"] == "True")
-        ttk.Checkbutton(frame, text=self.lang_manager.get("planb"), variable=self.use_planb_var).grid(row=2, column=1, sticky=tk.W, pady=5)
+        self.translate(ttk.Checkbutton(frame, variable=self.use_planb_var), "planb").grid(row=2, column=1, sticky=tk.W, pady=5)
+        
+        # VC补全算法
+        self.translate(ttk.Label(frame), "planner").grid(row=3, column=0, sticky=tk.W, pady=5)
+        self.planner_var = tk.StringVar(value=self.config["RECLIST"].get("planner", "greedy"))
+        planner_combobox = ttk.Combobox(frame, textvariable=self.planner_var, values=generator.planners, state="readonly", width=8)
+        planner_combobox.grid(row=3, column=1, padx=5, pady=5, sticky=tk.W)
     
     def create_oto_frame(self):
-        frame = ttk.LabelFrame(self.main_frame, text=self.lang_manager.get("oto_settings"), padding="15")
+        frame = self.translate(ttk.LabelFrame(self.main_frame, padding="15"), "oto_settings")
         frame.pack(fill=tk.X, pady=(0, 15))
         
         # 相同CV最大数量
-        ttk.Label(frame, text=self.lang_manager.get("max_same_cv")).grid(row=0, column=0, sticky=tk.W, pady=5)
+        self.translate(ttk.Label(frame), "max_same_cv").grid(row=0, column=0, sticky=tk.W, pady=5)
         self.oto_max_cv_var = tk.IntVar(value=int(self.config["OTOSET"]["oto_max_of_same_cv"]))
         oto_max_cv_spinbox = ttk.Spinbox(frame, from_=1, to=10, textvariable=self.oto_max_cv_var, width=5)
         oto_max_cv_spinbox.grid(row=0, column=1, padx=5, pady=5, sticky=tk.W)
         
         # 相同VC最大数量
-        ttk.Label(frame, text=self.lang_manager.get("max_same_vc")).grid(row=1, column=0, sticky=tk.W, pady=5)
+        self.translate(ttk.Label(frame), "max_same_vc").grid(row=1, column=0, sticky=tk.W, pady=5)
         self.oto_max_vc_var = tk.IntVar(value=int(self.config["OTOSET"]["oto_max_of_same_vc"]))
         oto_max_vc_spinbox = ttk.Spinbox(frame, from_=1, to=10, textvariable=self.oto_max_vc_var, width=5)
         oto_max_vc_spinbox.grid(row=1, column=1, padx=5, pady=5, sticky=tk.W)
         
         # 预设空白
-        ttk.Label(frame, text=self.lang_manager.get("preset_blank")).grid(row=2, column=0, sticky=tk.W, pady=5)
+        self.translate(ttk.Label(frame), "preset_blank").grid(row=2, column=0, sticky=tk.W, pady=5)
         self.oto_preset_blank_var = tk.IntVar(value=int(self.config["OTOSET"]["oto_preset_blank"]))
         oto_preset_blank_spinbox = ttk.Spinbox(frame, from_=0, to=5000, textvariable=self.oto_preset_blank_var, width=7)
         oto_preset_blank_spinbox.grid(row=2, column=1, padx=5, pady=5, sticky=tk.W)
         
         # BPM
-        ttk.Label(frame, text=self.lang_manager.get("bpm")).grid(row=3, column=0, sticky=tk.W, pady=5)
+        self.translate(ttk.Label(frame), "bpm").grid(row=3, column=0, sticky=tk.W, pady=5)
         self.oto_bpm_var = tk.IntVar(value=int(self.config["OTOSET"]["oto_bpm"]))
         oto_bpm_spinbox = ttk.Spinbox(frame, from_=60, to=200, textvariable=self.oto_bpm_var, width=5)
         oto_bpm_spinbox.grid(row=3, column=1, padx=5, pady=5, sticky=tk.W)
         
         # 使用下划线
         self.oto_devide_vccv_var = tk.BooleanVar(value=self.config["OTOSET"]["oto_devide_vccv"] == "True")
-        ttk.Checkbutton(frame, text=self.lang_manager.get("divide_vccv"), variable=self.oto_devide_vccv_var).grid(row=4, column=0, sticky=tk.W, pady=5)
+        self.translate(ttk.Checkbutton(frame, variable=self.oto_devide_vccv_var), "divide_vccv").grid(row=4, column=0, sticky=tk.W, pady=5)
+    
+    def create_preview_frame(self):
+        frame = self.translate(ttk.LabelFrame(self.main_frame, padding="10"), "preview")
+        frame.pack(fill=tk.X, pady=(0, 10))
+        
+        # 预览信息
+        self.preview_var = tk.StringVar()
+        self.show_preview(self.preview_message)
+        ttk.Label(frame, textvariable=self.preview_var, wraplength=440).pack(fill=tk.X)
+    
+    def watch_settings(self):
+        # 影响生成结果的设置变化时更新预览
+        for var in (self.input_path_var, self.length_var, self.include_cv_head_var, self.include_vv_var, self.use_planb_var, self.planner_var,
+                    self.oto_max_cv_var, self.oto_max_vc_var, self.oto_preset_blank_var, self.oto_bpm_var):
+            var.trace_add("write", self.schedule_preview)
+        self.schedule_preview()
+    
+    def schedule_preview(self, *args):
+        # 连续修改设置时只在停止修改一段时间后计算一次
+        if self.preview_after is not None:
+            self.root.after_cancel(self.preview_after)
+        self.preview_after = self.root.after(300, self.start_preview)
+    
+    def start_preview(self):
+        self.preview_after = None
+        try:
+            settings = {
+                "input_path": self.input_path_var.get(),
+                "length": self.length_var.get(),
+                "include_CV_head": self.include_cv_head_var.get(),
+                "include_VV": self.include_vv_var.get(),
+                "use_planb": self.use_planb_var.get(),
+                "planner": self.planner_var.get(),
+                "seed": int(self.config["RECLIST"].get("seed", "0")),
+                "oto_max_of_same_cv": self.oto_max_cv_var.get(),
+                "oto_max_of_same_vc": self.oto_max_vc_var.get(),
+                "oto_preset_blank": self.oto_preset_blank_var.get(),
+                "oto_bpm": self.oto_bpm_var.get(),
+                "oto_timing": generator.read_oto_timing(self.config)
+            }
+        except (tk.TclError, ValueError) as e:
+            # 正在输入的数值不完整时不预览
+            self.show_preview(("error", self.preview_serial, e))
+            return
+        if settings["length"] < 1 or settings["oto_bpm"] <= 0:
+            return
+        self.preview_serial += 1
+        self.show_preview(("pending",))
+        self.preview_requests.put((self.preview_serial, settings))
+        if self.preview_thread is None:
+            self.preview_thread = threading.Thread(target=self.run_preview, daemon=True)
+            self.preview_thread.start()
+        if not self.preview_polling:
+            self.preview_polling = True
+            self.root.after(50, self.poll_preview)
+    
+    def run_preview(self):
+        # 后台线程：依次取出最新的请求计算，不写入任何文件，结果放入队列
+        while True:
+            serial, settings = self.preview_requests.get()
+            while True:
+                try:
+                    serial, settings = self.preview_requests.get_nowait()
+                except queue.Empty:
+                    break
+            try:
+                self.preview_queue.put(("done", serial, generator.preview(**settings)))
+            except Exception as e:
+                # 任何错误都只显示在预览中，线程继续处理之后的请求
+                self.preview_queue.put(("error", serial, e))
+    
+    def poll_preview(self):
+        # 只显示最新一次预览的结果
+        while True:
+            try:
+                message = self.preview_queue.get_nowait()
+            except queue.Empty:
+                break
+            if message[1] != self.preview_serial:
+                continue
+            self.show_preview(message)
+            self.preview_polling = False
+            return
+        self.root.after(50, self.poll_preview)
+    
+    def show_preview(self, message):
+        # 记住最近一次显示的预览，切换语言时用新语言重新显示
+        self.preview_message = message
+        if message[0] == "done":
+            stats = message[2]
+            minutes, seconds = divmod(int(round(stats["recording_seconds"])), 60)
+            self.preview_var.set(self.lang_manager.get("preview_stats", stats["rows"], stats["fillers"], "{}:{:02d}".format(minutes, seconds),
+                                                       stats["oto_cv"] + stats["oto_vc"], stats["oto_cv"], stats["oto_vc"], stats["aliases"]))
+        elif message[0] == "error":
+            self.preview_var.set(self.lang_manager.get("preview_error", message[2]))
+        else:
+            self.preview_var.set(self.lang_manager.get("preview_pending"))
+    
+    def create_status_frame(self):
+        frame = ttk.Frame(self.main_frame)
+        frame.pack(fill=tk.X, pady=(0, 5))
+        
+        # 进度信息
+        self.status_var = tk.StringVar()
+        self.show_status(*self.status_message)
+        ttk.Label(frame, textvariable=self.status_var).pack(fill=tk.X)
+        self.progress_bar = ttk.Progressbar(frame, mode="indeterminate")
+        self.progress_bar.pack(fill=tk.X, pady=(5, 0))
     
     def create_button_frame(self):
         frame = ttk.Frame(self.main_frame)
         frame.pack(fill=tk.X, pady=(10, 0))
         
         # 开始生成按钮
-        start_button = ttk.Button(frame, text=self.lang_manager.get("start_generation"), command=self.start_generation)
-        start_button.pack(side=tk.RIGHT, padx=(5, 0))
+        self.start_button = self.translate(ttk.Button(frame, command=self.start_generation), "start_generation")
+        self.start_button.pack(side=tk.RIGHT, padx=(5, 0))
+        
+        # 取消按钮
+        self.cancel_button = self.translate(ttk.Button(frame, command=self.cancel_generation), "cancel")
+        self.cancel_button.pack(side=tk.RIGHT, padx=(5, 0))
+        
+        # 保存设置按钮
+        save_button = self.translate(ttk.Button(frame, command=self.save_settings), "save_settings")
+        save_button.pack(side=tk.RIGHT, padx=(5, 0))
         
         # 退出按钮
-        exit_button = ttk.Button(frame, text=self.lang_manager.get("exit"), command=self.on_exit)
+        exit_button = self.translate(ttk.Button(frame, command=self.on_exit), "exit")
         exit_button.pack(side=tk.LEFT, padx=(0, 5))
+        
+        self.update_generation_widgets()
     
-    def start_generation(self):
-        # 保存配置
+    def translate(self, widget, key):
+        # 登记控件对应的翻译键并设置文字
+        self.translated_widgets.append((widget, key))
+        widget.configure(text=self.lang_manager.get(key))
+        return widget
+    
+    def translate_menu_entry(self, menu, key):
+        # 登记菜单中最后添加的一项对应的翻译键
+        index = menu.index(tk.END)
+        self.translated_menu_entries.append((menu, index, key))
+        menu.entryconfigure(index, label=self.lang_manager.get(key))
+    
+    def show_status(self, key, *args):
+        # 记住状态栏的翻译键和参数，切换语言时用新语言重新显示；进度消息的第一个参数为阶段名
+        self.status_message = (key,) + args
+        if key == "progress_status":
+            args = (self.lang_manager.get("phase_" + args[0]),) + args[1:]
+        self.status_var.set(self.lang_manager.get(key, *args))
+    
+    def update_config(self):
+        # 将界面上的设置写入配置
         self.config["RECLIST"]["input_path"] = self.input_path_var.get()
         self.config["RECLIST"]["reclist_output_path"] = self.reclist_output_var.get()
         self.config["RECLIST"]["length"] = str(self.length_var.get())
@@ -289,6 +507,7 @@ class ReclistGeneratorGUI:
         self.config["RECLIST"]["include_VV"] = str(self.include_vv_var.get())
         self.config["RECLIST"]["use_underbar"] = str(self.use_underbar_var.get())
         self.config["RECLIST"]["use_planb"] = str(self.use_planb_var.get())
+        self.config["RECLIST"]["planner"] = self.planner_var.get()
         
         self.config["OTOSET"]["oto_output_path"] = self.oto_output_var.get()
         self.config["OTOSET"]["oto_max_of_same_cv"] = str(self.oto_max_cv_var.get())
@@ -296,66 +515,170 @@ class ReclistGeneratorGUI:
         self.config["OTOSET"]["oto_preset_blank"] = str(self.oto_preset_blank_var.get())
         self.config["OTOSET"]["oto_bpm"] = str(self.oto_bpm_var.get())
         self.config["OTOSET"]["oto_devide_vccv"] = str(self.oto_devide_vccv_var.get())
-        
+    
+    def get_settings(self):
+        # 将界面上的设置转换为generator.generate()的参数
+        return {
+            "input_path": self.input_path_var.get(),
+            "reclist_output_path": self.reclist_output_var.get(),
+            "length": self.length_var.get(),
+            "include_CV_head": self.include_cv_head_var.get(),
+            "include_VV": self.include_vv_var.get(),
+            "use_underbar": self.use_underbar_var.get(),
+            "use_planb": self.use_planb_var.get(),
+            "planner": self.planner_var.get(),
+            "seed": int(self.config["RECLIST"].get("seed", "0")),
+            "oto_output_path": self.oto_output_var.get(),
+            "oto_max_of_same_cv": self.oto_max_cv_var.get(),
+            "oto_max_of_same_vc": self.oto_max_vc_var.get(),
+            "oto_preset_blank": self.oto_preset_blank_var.get(),
+            "oto_bpm": self.oto_bpm_var.get(),
+            "oto_divide_vccv": self.oto_devide_vccv_var.get(),
+            "oto_repeat_output_path": self.config["OTOSET"].get("oto_repeat_output_path", ""),
+            "stats_output_path": self.config["OTOSET"].get("stats_output_path", ""),
+            "db_output_path": self.config["OTOSET"].get("db_output_path", ""),
+            "oto_timing": generator.read_oto_timing(self.config)
+        }
+    
+    def save_settings(self):
+        # 保存配置
+        self.update_config()
         self.save_config()
+    
+    def is_generating(self):
+        return self.generation_thread is not None and self.generation_thread.is_alive()
+    
+    def update_generation_widgets(self):
+        # 根据是否正在生成，切换按钮和进度条的状态
+        if self.is_generating():
+            self.start_button.state(["disabled"])
+            self.cancel_button.state(["!disabled"])
+            self.progress_bar.start(10)
+        else:
+            self.start_button.state(["!disabled"])
+            self.cancel_button.state(["disabled"])
+            self.progress_bar.stop()
+    
+    def start_generation(self):
+        if self.is_generating():
+            return
+        # 在后台线程中运行生成，界面通过队列接收进度
+        self.cancel_event = threading.Event()
+        self.generation_thread = threading.Thread(target=self.run_generation, args=(self.get_settings(), self.cancel_event), daemon=True)
+        self.generation_thread.start()
+        self.update_generation_widgets()
+        self.root.after(100, self.poll_generation)
+    
+    def run_generation(self, settings, cancel_event):
+        # 后台线程：不直接操作界面，所有消息都放入队列
+        last_report = {"phase": None, "time": 0.0}
+        
+        def progress(phase, rows, vc_remaining):
+            # 限制进度消息的频率
+            now = time.monotonic()
+            if phase != last_report["phase"] or now - last_report["time"] >= 0.05:
+                last_report["phase"] = phase
+                last_report["time"] = now
+                self.generation_queue.put(("progress", phase, rows, vc_remaining))
         
-        # 运行生成脚本
         try:
-            subprocess.run([sys.executable, "reclist-gen-cvvc.py"], check=True, cwd=os.getcwd())
-            # 显示生成成功消息
-            self.show_info(self.lang_manager.get("generation_success"), self.lang_manager.get("success_message"))
-        except subprocess.CalledProcessError as e:
-            self.show_error(self.lang_manager.get("generation_failed"), self.lang_manager.get("error_message", e))
+            gen_result = generator.generate(**settings, progress=progress, cancel=cancel_event)
+            self.generation_queue.put(("done", gen_result))
+        except generator.cancelled:
+            self.generation_queue.put(("cancelled",))
+        except (OSError, KeyError, ValueError, IndexError) as e:
+            self.generation_queue.put(("error", e))
         except Exception as e:
-            self.show_error(self.lang_manager.get("generation_failed"), self.lang_manager.get("unknown_error", e))
+            self.generation_queue.put(("unknown_error", e))
+    
+    def poll_generation(self):
+        # 处理后台线程传来的消息
+        while True:
+            try:
+                message = self.generation_queue.get_nowait()
+            except queue.Empty:
+                break
+            if message[0] == "progress":
+                self.show_status("progress_status", message[1], message[2], message[3])
+                continue
+            # 生成已结束
+            self.generation_thread.join()
+            self.update_generation_widgets()
+            self.show_status("ready")
+            if message[0] == "done":
+                gen_result = message[1]
+                self.last_stats = gen_result.stats()
+                # 显示生成成功消息
+                text = self.lang_manager.get("success_message") + "\n" + \
+                    self.lang_manager.get("generation_stats", gen_result.rows, gen_result.oto_count, gen_result.timing["total"])
+                if not gen_result.coverage.get("complete", True):
+                    missing = sum(len(names) for names in gen_result.coverage["missing"].values())
+                    text += "\n" + self.lang_manager.get("coverage_incomplete", missing)
+                self.show_info(self.lang_manager.get("generation_success"), text)
+            elif message[0] == "cancelled":
+                self.show_info(self.lang_manager.get("generation_cancelled"), self.lang_manager.get("cancelled_message"))
+            elif message[0] == "error":
+                self.show_error(self.lang_manager.get("generation_failed"), self.lang_manager.get("error_message", message[1]))
+            else:
+                self.show_error(self.lang_manager.get("generation_failed"), self.lang_manager.get("unknown_error", message[1]))
+            return
+        self.root.after(100, self.poll_generation)
+    
+    def cancel_generation(self):
+        if self.is_generating():
+            self.cancel_event.set()
+            self.show_status("cancelling")
     
     def create_menu(self):
-        # 创建菜单栏
+        # 创建菜单栏（只创建一次，切换语言时只更新文字）
         menubar = Menu(self.root)
         self.root.config(menu=menubar)
         
         # 创建语言菜单
         language_menu = Menu(menubar, tearoff=0)
-        menubar.add_cascade(label=self.lang_manager.get("menu_language"), menu=language_menu)
+        menubar.add_cascade(menu=language_menu)
+        self.translate_menu_entry(menubar, "menu_language")
         
-        # 添加语言选项
+        # 添加语言选项，选中当前语言
+        self.language_var = tk.StringVar(value=self.lang_manager.current_language)
         for lang_code, lang_name in self.lang_manager.languages.items():
             language_menu.add_radiobutton(
                 label=lang_name,
+                value=lang_code,
+                variable=self.language_var,
                 command=lambda code=lang_code: self.change_language(code)
             )
         
         # 创建帮助菜单
         help_menu = Menu(menubar, tearoff=0)
-        menubar.add_cascade(label=self.lang_manager.get("menu_help"), menu=help_menu)
+        menubar.add_cascade(menu=help_menu)
+        self.translate_menu_entry(menubar, "menu_help")
         
         # 添加查看README菜单项
-        help_menu.add_command(
-            label=self.lang_manager.get("menu_readme"),
-            command=self.open_readme
-        )
+        help_menu.add_command(command=self.open_readme)
+        self.translate_menu_entry(help_menu, "menu_readme")
         
         # 添加开源地址菜单项
-        help_menu.add_command(
-            label=self.lang_manager.get("menu_github"),
-            command=self.open_github
-        )
+        help_menu.add_command(command=self.open_github)
+        self.translate_menu_entry(help_menu, "menu_github")
+        
+        # 添加生成统计菜单项
+        help_menu.add_command(command=self.show_stats)
+        self.translate_menu_entry(help_menu, "menu_stats")
     
     def change_language(self, lang_code):
-        # 切换语言
+        # 切换语言：只更新已登记控件和菜单项的文字，界面上的设置和正在进行的生成都不受影响
         self.lang_manager.set_language(lang_code)
+        self.language_var.set(self.lang_manager.current_language)
         # 更新标题
         self.root.title(self.lang_manager.get("title"))
-        # 重新创建所有框架
-        self.main_frame.destroy()
-        self.main_frame = ttk.Frame(self.root, padding="20")
-        self.main_frame.pack(fill=tk.BOTH, expand=True)
-        self.create_path_frame()
-        self.create_reclist_frame()
-        self.create_oto_frame()
-        self.create_button_frame()
-        # 重新创建菜单栏
-        self.create_menu()
+        for widget, key in self.translated_widgets:
+            widget.configure(text=self.lang_manager.get(key))
+        for menu, index, key in self.translated_menu_entries:
+            menu.entryconfigure(index, label=self.lang_manager.get(key))
+        # 用新语言重新显示状态栏和预览
+        self.show_status(*self.status_message)
+        self.show_preview(self.preview_message)
     
     def show_info(self, title, message):
         info_window = tk.Toplevel(self.root)
@@ -413,6 +736,28 @@ class ReclistGeneratorGUI:
         
         error_window.wait_window()
     
+    def show_stats(self):
+        # 显示最近一次生成的统计（与stats_output_path写入的JSON相同）
+        if self.last_stats is None:
+            self.show_info(self.lang_manager.get("menu_stats"), self.lang_manager.get("no_stats"))
+            return
+        stats_window = tk.Toplevel(self.root)
+        stats_window.title(self.lang_manager.get("menu_stats"))
+        stats_window.geometry("480x520")
+        stats_window.transient(self.root)
+        
+        frame = ttk.Frame(stats_window, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        text = tk.Text(frame, wrap=tk.NONE, yscrollcommand=scrollbar.set)
+        text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.config(command=text.yview)
+        text.insert(tk.END, json.dumps(self.last_stats, ensure_ascii=False, indent=4))
+        text.config(state=tk.DISABLED)
+        
+        ttk.Button(stats_window, text="确定", command=stats_window.destroy).pack(pady=10)
+    
     def open_readme(self):
         # 打开readme.txt文件
         readme_path = os.path.join(os.getcwd(), "readme.txt")
@@ -420,30 +765,23 @@ class ReclistGeneratorGUI:
             if sys.platform == "win32":
                 os.startfile(readme_path)
             else:
+                import subprocess
                 subprocess.run(["open", readme_path])
     
     def open_github(self):
         # 打开开源地址
+        import webbrowser
         webbrowser.open("http://github.com/sdercolin/reclist-gen-cvvc/")
     
     def on_exit(self):
-        # 保存配置
-        self.config["RECLIST"]["input_path"] = self.input_path_var.get()
-        self.config["RECLIST"]["reclist_output_path"] = self.reclist_output_var.get()
-        self.config["RECLIST"]["length"] = str(self.length_var.get())
-        self.config["RECLIST"]["include_CV_head"] = str(self.include_cv_head_var.get())
-        self.config["RECLIST"]["include_VV"] = str(self.include_vv_var.get())
-        self.config["RECLIST"]["use_underbar"] = str(self.use_underbar_var.get())
-        self.config["RECLIST"]["use_planb"] = str(self.use_planb_var.get())
-        
-        self.config["OTOSET"]["oto_output_path"] = self.oto_output_var.get()
-        self.config["OTOSET"]["oto_max_of_same_cv"] = str(self.oto_max_cv_var.get())
-        self.config["OTOSET"]["oto_max_of_same_vc"] = str(self.oto_max_vc_var.get())
-        self.config["OTOSET"]["oto_preset_blank"] = str(self.oto_preset_blank_var.get())
-        self.config["OTOSET"]["oto_bpm"] = str(self.oto_bpm_var.get())
-        self.config["OTOSET"]["oto_devide_vccv"] = str(self.oto_devide_vccv_var.get())
-        
-        self.save_config()
+        # 停止正在进行的生成（不会留下写了一半的文件）
+        if self.is_generating():
+            self.cancel_event.set()
+            self.generation_thread.join()
+        # 设置在读取或保存之后改动过时才保存配置
+        self.update_config()
+        if self.config_snapshot() != self.saved_config:
+            self.save_config()
         # 退出程序
         self.root.quit()
 